@@ -9,8 +9,11 @@
 
 import datetime
 import logging
+import time
+from multiprocessing import Pool
 
 from django.core.management.base import BaseCommand
+from django.db import connections
 
 from pootle.runner import set_sync_mode
 from pootle_project.models import Project
@@ -39,6 +42,37 @@ class SkipChecksMixin(object):
         )
 
 
+#: Command instance and options used by the worker processes of a pool
+_worker_command = None
+_worker_options = None
+
+
+def _init_worker(command, options):
+    global _worker_command, _worker_options
+
+    _worker_command = command
+    _worker_options = options
+    # connections inherited from the parent process can't be shared: let
+    # every worker open its own
+    connections.close_all()
+
+
+def _run_worker(tp_pk):
+    """Runs the worker's command over the translation project `tp_pk`.
+
+    :return: a tuple of `(pootle_path, elapsed_seconds, succeeded)`.
+    """
+    start = time.time()
+    try:
+        tp = TranslationProject.objects.get(pk=tp_pk)
+    except Exception:
+        logging.exception(u"Failed to retrieve translation project %s", tp_pk)
+        return (str(tp_pk), time.time() - start, False)
+
+    succeeded = _worker_command.do_translation_project(tp, **_worker_options)
+    return (tp.pootle_path, time.time() - start, succeeded)
+
+
 class PootleCommand(BaseCommand):
     """Base class for handling recursive pootle store management commands."""
 
@@ -63,6 +97,15 @@ class PootleCommand(BaseCommand):
             default=False,
             help=("Run all jobs in a single process, without using rq workers"),
         )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help=(
+                "Number of translation projects to process in parallel, each "
+                "one in its own worker process"
+            ),
+        )
 
     def __init__(self, *args, **kwargs):
         self.languages = []
@@ -70,6 +113,10 @@ class PootleCommand(BaseCommand):
         super().__init__(*args, **kwargs)
 
     def do_translation_project(self, tp, **options):
+        """Runs the command over translation project `tp`.
+
+        :return: `False` if processing failed, `True` otherwise.
+        """
         process_stores = True
 
         if hasattr(self, "handle_translation_project"):
@@ -78,10 +125,10 @@ class PootleCommand(BaseCommand):
                 process_stores = self.handle_translation_project(tp, **options)
             except Exception:
                 logging.exception(u"Failed to run %s over %s", self.name, tp)
-                return
+                return False
 
             if not process_stores:
-                return
+                return True
 
         if hasattr(self, "handle_all_stores"):
             logging.info(u"Running %s over %s's files", self.name, tp)
@@ -89,7 +136,43 @@ class PootleCommand(BaseCommand):
                 self.handle_all_stores(tp, **options)
             except Exception:
                 logging.exception(u"Failed to run %s over %s's files", self.name, tp)
-                return
+                return False
+
+        return True
+
+    def do_translation_projects_parallel(self, tp_pks, **options):
+        """Runs the command over translation projects `tp_pks` using a pool
+        of `options["jobs"]` worker processes.
+
+        Progress is reported in the same order as `tp_pks`. A failure over
+        one translation project doesn't prevent the others from being
+        processed.
+
+        :return: list of `pootle_path`s of the translation projects which
+            failed to be processed.
+        """
+        # workers are forked: make sure they don't inherit open connections
+        connections.close_all()
+
+        failed = []
+        total = len(tp_pks)
+        with Pool(options["jobs"], _init_worker, (self, options)) as pool:
+            results = pool.imap(_run_worker, tp_pks)
+            for i, (pootle_path, elapsed, succeeded) in enumerate(results, 1):
+                self.stdout.write(
+                    "[%d/%d] %s %s in %.2fs"
+                    % (
+                        i,
+                        total,
+                        pootle_path,
+                        "done" if succeeded else "FAILED",
+                        elapsed,
+                    )
+                )
+                if not succeeded:
+                    failed.append(pootle_path)
+
+        return failed
 
     def handle(self, **options):
         # adjust debug level to the verbosity option
@@ -129,6 +212,20 @@ class PootleCommand(BaseCommand):
         if options["no_rq"]:
             set_sync_mode(options["noinput"])
 
+        if options["jobs"] > 1:
+            tp_pks = [tp.pk for tp in self.get_translation_projects()]
+            failed = self.do_translation_projects_parallel(tp_pks, **options)
+            if failed:
+                self.stderr.write(
+                    "Failed to run %s over: %s" % (self.name, ", ".join(failed))
+                )
+            return
+
+        for tp in self.get_translation_projects():
+            self.do_translation_project(tp, **options)
+
+    def get_translation_projects(self):
+        """Yields the translation projects the command runs over."""
         if self.projects:
             project_query = Project.objects.filter(code__in=self.projects)
         else:
@@ -143,5 +240,4 @@ class PootleCommand(BaseCommand):
             if self.languages:
                 tp_query = tp_query.filter(language__code__in=self.languages)
 
-            for tp in tp_query.iterator():
-                self.do_translation_project(tp, **options)
+            yield from tp_query.iterator()
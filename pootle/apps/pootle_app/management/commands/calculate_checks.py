@@ -12,6 +12,7 @@ import os
 os.environ["DJANGO_SETTINGS_MODULE"] = "pootle.settings"
 
 from pootle.core.checks.checker import QualityCheckUpdater
+from pootle.runner import set_sync_mode
 
 from . import PootleCommand
 
@@ -29,14 +30,42 @@ class Command(PootleCommand):
             default=None,
             help="Check to recalculate",
         )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            default=False,
+            help="Skip units which didn't change since their checks were calculated",
+        )
+
+    def report_progress(self, checked, updated, elapsed):
+        self.stdout.write(
+            u"Checked %d units (%d updated) in %.2fs (%.1f units/sec)"
+            % (checked, updated, elapsed, checked / elapsed if elapsed else checked)
+        )
+
+    def get_updater(self, translation_project=None, **options):
+        return QualityCheckUpdater(
+            options["check_names"],
+            translation_project,
+            jobs=options["jobs"],
+            progress=self.report_progress,
+            incremental=options["incremental"],
+        )
 
     def handle_all_stores(self, translation_project, **options):
         self.stdout.write(u"Running %s for %s" % (self.name, translation_project))
-        QualityCheckUpdater(options["check_names"], translation_project).update()
+        self.get_updater(translation_project, **options).update()
 
     def handle_all(self, **options):
+        # `--jobs` parallelizes the checks of the units themselves, so
+        # translation projects are processed one after another
+        if options["no_rq"]:
+            set_sync_mode(options["noinput"])
+
         if not self.projects and not self.languages:
             self.stdout.write(u"Running %s (noargs)" % self.name)
-            QualityCheckUpdater(options["check_names"]).update()
-        else:
-            super().handle_all(**options)
+            self.get_updater(**options).update()
+            return
+
+        for tp in self.get_translation_projects():
+            self.do_translation_project(tp, **options)
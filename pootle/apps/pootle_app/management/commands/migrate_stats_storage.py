@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import os
+
+# This must be run before importing Django.
+os.environ["DJANGO_SETTINGS_MODULE"] = "pootle.settings"
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pootle.core.mixins.treeitem import (
+    STATS_STORAGES,
+    CachedMethods,
+    get_stats_storage,
+)
+from pootle_app.models import Directory
+from pootle_store.models import Store
+
+
+CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Copy cached stats into the layout set in ZING_STATS_STORAGE."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from",
+            dest="source",
+            choices=sorted(STATS_STORAGES),
+            help=(
+                "Layout to copy stats from. Defaults to the layout not set "
+                "in ZING_STATS_STORAGE."
+            ),
+        )
+        parser.add_argument(
+            "--delete",
+            action="store_true",
+            default=False,
+            help="Remove stats from the source layout once copied.",
+        )
+
+    def handle(self, **options):
+        target_layout = settings.ZING_STATS_STORAGE
+        source_layout = options["source"]
+        if source_layout is None:
+            source_layout = next(
+                layout for layout in sorted(STATS_STORAGES) if layout != target_layout
+            )
+        if source_layout == target_layout:
+            raise CommandError(
+                "Stats are already stored using the %r layout." % target_layout
+            )
+
+        source = get_stats_storage(source_layout)
+        target = get_stats_storage(target_layout)
+        names = CachedMethods.get_all()
+
+        paths = list(
+            Directory.objects.live()
+            .exclude(pootle_path="/")
+            .values_list("pootle_path", flat=True)
+        )
+        paths.extend(Store.objects.live().values_list("pootle_path", flat=True))
+
+        copied = 0
+        for i in range(0, len(paths), CHUNK_SIZE):
+            chunk = paths[i : i + CHUNK_SIZE]
+            values = {
+                path: path_values
+                for path, path_values in zip(chunk, source.get_many(chunk))
+                if any(value is not None for value in path_values.values())
+            }
+            target.set_many(values)
+            copied += len(values)
+
+            if options["delete"]:
+                for path in values:
+                    source.delete(path, names)
+
+        self.stdout.write(
+            "Copied stats for %d paths from the %r layout to the %r layout."
+            % (copied, source_layout, target_layout)
+        )
@@ -12,7 +12,9 @@ import os
 # This must be run before importing Django.
 os.environ["DJANGO_SETTINGS_MODULE"] = "pootle.settings"
 
+from pootle.core.stats import StatsEngine
 from pootle_store.models import Store
+from pootle_store.stats import refresh_stores_stats
 
 from . import PootleCommand
 
@@ -34,14 +36,29 @@ class Command(PootleCommand):
             default=False,
             help="Process disabled projects",
         )
+        parser.add_argument(
+            "--batch",
+            action="store_true",
+            dest="batch",
+            default=False,
+            help="Calculate stats in-process using batched queries",
+        )
 
     def handle_all(self, **options):
         self.__class__.process_disabled_projects = options["disabled_projects"]
 
         super().handle_all(**options)
 
-    def handle_all_stores(self, translation_project, **options_):
+    def handle_all_stores(self, translation_project, **options):
         stores = Store.objects.live().filter(translation_project=translation_project)
-        for store in stores.iterator():
-            logger.info("Add job to update stats for %s", store.pootle_path)
-            store.update_all_cache()
+        if options["batch"]:
+            paths = list(stores.values_list("pootle_path", flat=True))
+            paths.append(translation_project.pootle_path)
+            result = StatsEngine(paths=paths).run()
+            self.stdout.write(
+                "Refreshed stats for %s: %s" % (translation_project.pootle_path, result)
+            )
+            return
+
+        logger.info("Update stats for %s", translation_project.pootle_path)
+        refresh_stores_stats(stores)
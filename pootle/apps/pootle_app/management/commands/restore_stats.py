@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import os
+
+# This must be run before importing Django.
+os.environ["DJANGO_SETTINGS_MODULE"] = "pootle.settings"
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pootle.core.mixins.treeitem import get_stats_storage
+from pootle_statistics.models import STATS_CHUNK_SIZE, TreeItemStats
+
+
+class Command(BaseCommand):
+    help = "Restore the stats cache from stats persisted in the DB."
+
+    def handle(self, **options):
+        if not settings.ZING_STATS_PERSISTENT:
+            raise CommandError(
+                "Stats are not persisted in the DB. Set ZING_STATS_PERSISTENT "
+                "and run `refresh_stats` first."
+            )
+
+        storage = get_stats_storage()
+        restored = 0
+        values = {}
+        for stats in TreeItemStats.objects.order_by("pk").iterator():
+            values[stats.pootle_path] = stats.get_values()
+            if len(values) == STATS_CHUNK_SIZE:
+                storage.set_many(values)
+                restored += len(values)
+                values = {}
+
+        storage.set_many(values)
+        restored += len(values)
+
+        self.stdout.write("Restored stats for %d paths." % restored)
@@ -8,7 +8,9 @@
 # AUTHORS file for copyright and authorship information.
 
 import os
+import sqlite3
 import sys
+from collections import OrderedDict
 from hashlib import md5
 
 # This must be run before importing Django.
@@ -19,8 +21,13 @@ from elasticsearch import Elasticsearch, helpers
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
+from pootle.core.search.backends import LocalTMBackend
 from pootle.core.search.backends.elasticsearch import INDEX_PREFIX
+from pootle.core.search.broker import DEFAULT_ENGINE_MODULE, expire_cache
 from pootle.core.utils import dateformat
+from pootle.core.utils.list import chunked
+from pootle_language.models import Language
+from pootle_misc.util import import_func
 from pootle_store.models import Unit
 
 
@@ -153,7 +160,9 @@ class Command(BaseCommand):
                 self.stdout.write("%s (%s%%)" % (i, percent), ending="\r")
                 self.stdout.flush()
 
-            yield self.parser.get_unit_data(unit)
+            data = self.parser.get_unit_data(unit)
+            self.languages.add(data["_index"][len(INDEX_PREFIX) :])
+            yield data
 
         if i != total:
             self.stdout.write("Expected %d, loaded %d." % (total, i))
@@ -164,10 +173,16 @@ class Command(BaseCommand):
 
         tm_settings = settings.ZING_TM_SERVER
 
-        self.es = Elasticsearch(
-            [{"host": tm_settings["HOST"], "port": tm_settings["PORT"]}],
-            retry_on_timeout=True,
-        )
+        self.es = None
+        self.local_tm = None
+        engine = import_func(tm_settings.get("ENGINE", DEFAULT_ENGINE_MODULE))
+        if issubclass(engine, LocalTMBackend):
+            self.local_tm = engine()
+        else:
+            self.es = Elasticsearch(
+                [{"host": tm_settings["HOST"], "port": tm_settings["PORT"]}],
+                retry_on_timeout=True,
+            )
 
         self.parser = DBParser(
             stdout=self.stdout, disabled_projects=options["disabled_projects"],
@@ -176,7 +191,15 @@ class Command(BaseCommand):
     def _set_latest_indexed_revision(self, **options):
         self.last_indexed_revision = -1
 
-        if not options["rebuild"] and not options["refresh"]:
+        if self.local_tm is not None:
+            if not options["rebuild"] and not options["refresh"]:
+                try:
+                    self.last_indexed_revision = self.local_tm.get_max_revision()
+                except sqlite3.Error as e:
+                    self.stderr.write(
+                        "Cannot read the local TM, indexing everything: %s" % e
+                    )
+        elif not options["rebuild"] and not options["refresh"]:
             result = self.es.search(
                 index=ALL_TM_INDICES,
                 body={"aggs": {"max_revision": {"max": {"field": "revision"}}}},
@@ -191,12 +214,36 @@ class Command(BaseCommand):
 
         self.stdout.write("Last indexed revision = %s" % self.last_indexed_revision)
 
+    def _update_local_tm(self, translations):
+        """Adds `translations` to the local TM, in chunks grouped by language."""
+        for chunk in chunked(translations, BULK_CHUNK_SIZE):
+            objs = OrderedDict()
+            for data in chunk:
+                language = data.pop("_index")[len(INDEX_PREFIX) :]
+                data["id"] = data.pop("_id")
+                objs.setdefault(language, []).append(data)
+            for language, language_objs in objs.items():
+                self.local_tm.update_many(language, language_objs)
+                expire_cache(language)
+
     def handle(self, **options):
         self._initialize(**options)
 
         if options["rebuild"] and not options["dry_run"]:
-            self.es.indices.delete(index=ALL_TM_INDICES)
+            if self.local_tm is not None:
+                self.local_tm.clear()
+            else:
+                self.es.indices.delete(index=ALL_TM_INDICES)
+            for language in Language.objects.values_list("code", flat=True):
+                expire_cache(language)
 
         self._set_latest_indexed_revision(**options)
 
-        helpers.bulk(self.es, self._parse_translations(**options))
+        # languages with translations written to the TM
+        self.languages = set()
+        if self.local_tm is not None:
+            self._update_local_tm(self._parse_translations(**options))
+        else:
+            helpers.bulk(self.es, self._parse_translations(**options))
+            for language in self.languages:
+                expire_cache(language)
@@ -9,6 +9,8 @@
 
 import logging
 import re
+import threading
+from collections import Counter
 from functools import lru_cache
 
 from translate.filters import checks
@@ -16,13 +18,18 @@ from translate.filters.decorators import Category, cosmetic, critical
 from translate.lang import data
 
 from django.conf import settings
-from django.utils.translation import gettext_lazy as _
+from django.utils.translation import get_language, gettext_lazy as _
 
 from .util import import_func
 
 
 re._MAXCACHE = 2000
 
+#: Version of Zing's own quality checks. Bump it whenever changes to the checks
+#: may change their results, so incremental runs of `calculate_checks`
+#: recalculate them for all units.
+CHECKS_VERSION = 1
+
 CATEGORY_IDS = {
     "critical": Category.CRITICAL,
     "cosmetic": Category.COSMETIC,
@@ -274,6 +281,67 @@ linebreaks_double_regex = re.compile(r"(?<!\n)\n\n(?!\n)")
 linebreaks_multiple_regex = re.compile(r"(?<!\n)\n{3,}(?!\n)")
 
 
+#: Placeholder regexes scanned by `scan_placeholders()`, keyed by the name of
+#: the check using them, along with a character all their matches contain
+placeholder_regexes = {
+    "java_format": (java_format_regex, "{"),
+    "template_format": (template_format_regex, "$"),
+    "android_format": (android_format_regex, "%"),
+    "objective_c_format": (objective_c_format_regex, "%"),
+    "javaencoded_unicode": (javaencoded_unicode_regex, "\\"),
+    "dollar_sign_placeholders": (dollar_sign_placeholders_regex, "$"),
+    "dollar_sign_closure_placeholders": (dollar_sign_closure_placeholders_regex, "$"),
+    "percent_sign_placeholders": (percent_sign_placeholders_regex, "%"),
+    "percent_sign_closure_placeholders": (
+        percent_sign_closure_placeholders_regex,
+        "%",
+    ),
+    "uppercase_placeholders": (uppercase_placeholders_regex, "_"),
+    "mustache_placeholders": (mustache_placeholders_regex, "{"),
+    "percent_brace_placeholders": (percent_brace_placeholders_regex, "%"),
+}
+
+
+class PlaceholderScan(object):
+    """Placeholders found in a string by all the regexes in
+    `placeholder_regexes`.
+    """
+
+    def __init__(self, placeholders, is_plurr):
+        """
+        :param placeholders: dict of `Counter`s of the placeholders found,
+            keyed by check name. Checks with no placeholders found are left
+            out.
+        :param is_plurr: whether the string is Plurr-formatted.
+        """
+        self.placeholders = placeholders
+        self.is_plurr = is_plurr
+
+
+@lru_cache(maxsize=4096)
+def scan_placeholders(string):
+    """Scans `string` for placeholders of all kinds at once.
+
+    Characters in the string are collected in a single pass, and only the
+    regexes which can possibly match them are run. Since the same strings
+    are checked over and over (sources are shared by all languages, and
+    every check of a unit works on the same strings), scans are memoized.
+
+    :return: a `PlaceholderScan` instance.
+    """
+    chars = set(string)
+    placeholders = {}
+    for name, (regex, char) in placeholder_regexes.items():
+        if char not in chars:
+            continue
+        found = regex.findall(string)
+        if found:
+            placeholders[name] = Counter(found)
+
+    is_plurr = "{" in chars and plurr_format_regex.search(string) is not None
+    return PlaceholderScan(placeholders, is_plurr)
+
+
 def clean_plurr_placeholder(string):
     return plurr_plural_suffix_regex.sub("", string)
 
@@ -318,83 +386,59 @@ class ENChecker(checks.UnitChecker):
 
     @critical
     def java_format(self, str1, str2, **kwargs):
-        return _generic_check(str1, str2, java_format_regex, u"java_format")
+        return _placeholders_check(str1, str2, u"java_format")
 
     @critical
     def template_format(self, str1, str2, **kwargs):
-        return _generic_check(str1, str2, template_format_regex, u"template_format")
+        return _placeholders_check(str1, str2, u"template_format")
 
     @critical
     def android_format(self, str1, str2, **kwargs):
-        return _generic_check(str1, str2, android_format_regex, u"android_format")
+        return _placeholders_check(str1, str2, u"android_format")
 
     @critical
     def objective_c_format(self, str1, str2, **kwargs):
-        return _generic_check(
-            str1, str2, objective_c_format_regex, u"objective_c_format"
-        )
+        return _placeholders_check(str1, str2, u"objective_c_format")
 
     @critical
     def javaencoded_unicode(self, str1, str2, **kwargs):
-        return _generic_check(
-            str1, str2, javaencoded_unicode_regex, u"javaencoded_unicode"
-        )
+        return _placeholders_check(str1, str2, u"javaencoded_unicode")
 
     @critical
     def dollar_sign_placeholders(self, str1, str2, **kwargs):
-        return _generic_check(
-            str1, str2, dollar_sign_placeholders_regex, u"dollar_sign_placeholders"
-        )
+        return _placeholders_check(str1, str2, u"dollar_sign_placeholders")
 
     @critical
     def dollar_sign_closure_placeholders(self, str1, str2, **kwargs):
-        return _generic_check(
-            str1,
-            str2,
-            dollar_sign_closure_placeholders_regex,
-            u"dollar_sign_closure_placeholders",
-        )
+        return _placeholders_check(str1, str2, u"dollar_sign_closure_placeholders")
 
     @critical
     def percent_sign_placeholders(self, str1, str2, **kwargs):
-        return _generic_check(
-            str1, str2, percent_sign_placeholders_regex, u"percent_sign_placeholders"
-        )
+        return _placeholders_check(str1, str2, u"percent_sign_placeholders")
 
     @critical
     def percent_sign_closure_placeholders(self, str1, str2, **kwargs):
-        return _generic_check(
-            str1,
-            str2,
-            percent_sign_closure_placeholders_regex,
-            u"percent_sign_closure_placeholders",
-        )
+        return _placeholders_check(str1, str2, u"percent_sign_closure_placeholders")
 
     @critical
     def uppercase_placeholders(self, str1, str2, **kwargs):
         # Ignore check for Plurr-formatted strings
-        if plurr_format_regex.search(str1):
+        if scan_placeholders(str1).is_plurr:
             return True
 
-        return _generic_check(
-            str1, str2, uppercase_placeholders_regex, u"uppercase_placeholders"
-        )
+        return _placeholders_check(str1, str2, u"uppercase_placeholders")
 
     @critical
     def mustache_placeholders(self, str1, str2, **kwargs):
         # Ignore check for Plurr-formatted strings
-        if plurr_format_regex.search(str1):
+        if scan_placeholders(str1).is_plurr:
             return True
 
-        return _generic_check(
-            str1, str2, mustache_placeholders_regex, u"mustache_placeholders"
-        )
+        return _placeholders_check(str1, str2, u"mustache_placeholders")
 
     @critical
     def percent_brace_placeholders(self, str1, str2, **kwargs):
-        return _generic_check(
-            str1, str2, percent_brace_placeholders_regex, u"percent_brace_placeholders"
-        )
+        return _placeholders_check(str1, str2, u"percent_brace_placeholders")
 
     @critical
     def mustache_placeholder_pairs(self, str1, str2, **kwargs):
@@ -719,7 +763,7 @@ class ENChecker(checks.UnitChecker):
             return fingerprint
 
         # Ignore check for Plurr-formatted strings
-        if plurr_format_regex.search(str1):
+        if scan_placeholders(str1).is_plurr:
             return True
 
         if check_translation(get_fingerprint, str1, str2):
@@ -821,7 +865,7 @@ class ENChecker(checks.UnitChecker):
             return fingerprint
 
         # Ignore check for Plurr-formatted strings
-        if plurr_format_regex.search(str1):
+        if scan_placeholders(str1).is_plurr:
             return True
 
         if check_translation(get_fingerprint, str1, str2):
@@ -1013,7 +1057,7 @@ class ENChecker(checks.UnitChecker):
         """For plurr-formatted strings, checks the syntax is correct."""
         # Ignore check for empty target strings or non Plurr-formatted
         # source strings
-        if str2 == u"" or not plurr_format_regex.search(str1):
+        if str2 == u"" or not scan_placeholders(str1).is_plurr:
             return True
 
         # Ignore check if library is missing
@@ -1181,11 +1225,65 @@ def run_given_filters(checker, unit, check_names=None):
     return failures
 
 
+#: Checkers built by the current thread, see `get_checker()`
+_checkers = threading.local()
+
+
+def filtererrorhandler(functionname, str1, str2, e):
+    logging.error(u"Error in filter %s: %r, %r, %s", functionname, str1, str2, e)
+    return False
+
+
+def get_checker(checkstyle, language_code):
+    """Returns the checker for projects with the `checkstyle` checker style,
+    in the `language_code` language.
+
+    Building a checker is costly, so every checker is built once and reused
+    afterwards. Checkers keep state while running filters, hence they are
+    reused within the thread which built them only.
+
+    :return: a `TeeChecker` instance wrapping the site quality checker if
+        set, or the checker for `checkstyle` otherwise.
+    """
+    if settings.ZING_QUALITY_CHECKER:
+        checkstyle = None
+
+    key = (settings.ZING_QUALITY_CHECKER, checkstyle, language_code)
+    registry = getattr(_checkers, "registry", None)
+    if registry is None:
+        registry = _checkers.registry = {}
+
+    if key not in registry:
+        # We do not use default Translate Toolkit checkers; instead use
+        # our own one
+        if settings.ZING_QUALITY_CHECKER:
+            checkerclasses = [import_func(settings.ZING_QUALITY_CHECKER)]
+        else:
+            checkerclasses = [
+                checks.projectcheckers.get(checkstyle, checks.StandardChecker)
+            ]
+
+        registry[key] = checks.TeeChecker(
+            checkerclasses=checkerclasses,
+            excludefilters=excluded_filters,
+            errorhandler=filtererrorhandler,
+            languagecode=language_code,
+        )
+
+    return registry[key]
+
+
 def get_qualitychecks():
+    """Returns the categories of all available checks, keyed by check name."""
+    return dict(_get_qualitychecks(settings.ZING_QUALITY_CHECKER))
+
+
+@lru_cache()
+def _get_qualitychecks(quality_checker):
     available_checks = {}
 
-    if settings.ZING_QUALITY_CHECKER:
-        checkers = [import_func(settings.ZING_QUALITY_CHECKER)()]
+    if quality_checker:
+        checkers = [import_func(quality_checker)()]
     else:
         checkers = [checker() for checker in checks.projectcheckers.values()]
 
@@ -1209,8 +1307,14 @@ def get_qualitychecks():
 
 
 def get_qualitycheck_schema():
+    # titles are translated, so the schema is built once per language
+    return _get_qualitycheck_schema(settings.ZING_QUALITY_CHECKER, get_language())
+
+
+@lru_cache()
+def _get_qualitycheck_schema(quality_checker, language):
     d = {}
-    checks = get_qualitychecks()
+    checks = _get_qualitychecks(quality_checker)
 
     for check, cat in checks.items():
         if cat not in d:
@@ -1258,37 +1362,23 @@ def get_qc_data_by_name(check_name):
         }
 
 
-def _generic_check(str1, str2, regex, message):
-    def get_fingerprint(string, is_source=False, translation=""):
-        chunks = regex.split(string)
-
-        d = {}
-        fingerprint = ""
-
-        if is_source and len(chunks) == 1:
-            raise SkipCheck()
-
-        for index, chunk in enumerate(chunks):
-            # Chunks contain ordinary text in even positions, so they are safe
-            # to be skipped.
-            if index % 2 == 0:
-                continue
-
-            # special text
-            if chunk in d:
-                d[chunk] += 1
-            else:
-                d[chunk] = 1
-
-        for key in sorted(d.keys()):
-            fingerprint += u"\001%s\001%s" % (key, d[key])
+def _placeholders_check(str1, str2, name):
+    """Checks placeholders found by `scan_placeholders()` for the check `name`
+    are the same in both strings.
+    """
+    if str2 == "":
+        # no real translation provided, skipping
+        return True
 
-        return fingerprint
+    source_placeholders = scan_placeholders(str1).placeholders.get(name)
+    if source_placeholders is None:
+        # skip translation as it doesn't match required criteria
+        return True
 
-    if check_translation(get_fingerprint, str1, str2):
+    if source_placeholders == scan_placeholders(str2).placeholders.get(name):
         return True
 
-    raise checks.FilterFailure(message)
+    raise checks.FilterFailure(name)
 
 
 def check_translation(get_fingerprint_func, string, translation):
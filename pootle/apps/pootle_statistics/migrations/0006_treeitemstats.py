@@ -0,0 +1,55 @@
+# Generated by Django 3.1.12 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+from pootle.core.utils.db import set_mysql_collation_for_column
+
+
+def make_treeitemstats_paths_cs(apps, schema_editor):
+    cursor = schema_editor.connection.cursor()
+    set_mysql_collation_for_column(
+        apps,
+        cursor,
+        "pootle_statistics.TreeItemStats",
+        "pootle_path",
+        "utf8_bin",
+        "varchar(255)",
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pootle_statistics", "0005_auto_20200124_0617"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TreeItemStats",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "pootle_path",
+                    models.CharField(db_index=True, max_length=255, unique=True),
+                ),
+                ("total", models.IntegerField(null=True)),
+                ("translated", models.IntegerField(null=True)),
+                ("fuzzy", models.IntegerField(null=True)),
+                ("suggestions", models.IntegerField(null=True)),
+                ("critical", models.IntegerField(null=True)),
+                ("checks", models.TextField(null=True)),
+                ("last_action", models.TextField(null=True)),
+                ("last_updated", models.IntegerField(null=True)),
+                ("mtime", models.BigIntegerField(null=True)),
+            ],
+        ),
+        migrations.RunPython(make_treeitemstats_paths_cs),
+    ]
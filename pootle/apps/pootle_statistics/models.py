@@ -7,8 +7,12 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
+import datetime
+import json
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.db.models import F
 from django.template.defaultfilters import truncatechars
@@ -16,7 +20,10 @@ from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
 from pootle.core.log import SCORE_CHANGED, log
+from pootle.core.mixins.treeitem import CachedMethods
 from pootle.core.utils import dateformat
+from pootle.core.utils.list import chunked
+from pootle.core.utils.timezone import make_aware
 from pootle_misc.checks import check_names
 from pootle_store.constants import FUZZY, TRANSLATED, UNTRANSLATED
 from pootle_store.fields import to_python
@@ -24,6 +31,11 @@ from pootle_store.fields import to_python
 
 SIMILARITY_THRESHOLD = 0.5
 
+#: Maximum number of paths looked up in a single query
+STATS_CHUNK_SIZE = 500
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
 
 #: These are the values for the 'type' field of Submission
 class SubmissionTypes(object):
@@ -732,3 +744,160 @@ class ScoreLog(models.Model):
             TranslationActionCodes.SUGG_ACCEPTED: get_sugg_accepted,
             TranslationActionCodes.SUGG_REVIEWED_ACCEPTED: get_sugg_reviewed_accepted,
         }.get(self.action_code, lambda: (None, None))()
+
+
+class TreeItemStatsManager(models.Manager):
+    def get_many(self, paths):
+        """Retrieves persisted stats for `paths`.
+
+        :return: a dict of `{name: value}` dicts keyed by `pootle_path`.
+            Paths with no persisted stats are omitted.
+        """
+        values = {}
+        for chunk in chunked(paths, STATS_CHUNK_SIZE):
+            values.update(
+                {
+                    stats.pootle_path: stats.get_values()
+                    for stats in self.filter(pootle_path__in=chunk)
+                }
+            )
+        return values
+
+    def set_many(self, paths_values):
+        """Persists stats values for several paths.
+
+        :param paths_values: a dict of `{path: {name: value}}`. `None` values
+            are skipped.
+        """
+        for chunk in chunked(paths_values.keys(), STATS_CHUNK_SIZE):
+            existing = {
+                stats.pootle_path: stats for stats in self.filter(pootle_path__in=chunk)
+            }
+            created = []
+            for path in chunk:
+                stats = existing.get(path)
+                if stats is None:
+                    stats = self.model(pootle_path=path)
+                    created.append(stats)
+                stats.set_values(paths_values[path])
+
+            if created:
+                # another process may have persisted stats for the same path
+                # in the meantime, it's fine to keep theirs
+                self.bulk_create(created, ignore_conflicts=True)
+            if existing:
+                self.bulk_update(existing.values(), self.model.STATS_FIELDS)
+
+    def delete_values(self, path, names):
+        """Removes persisted stats values for `path`."""
+        stats = self.filter(pootle_path=path).first()
+        if stats is not None:
+            stats.set_values({name: None for name in names}, skip_none=False)
+            stats.save()
+
+
+class TreeItemStats(models.Model):
+    """Persisted copy of the cached stats of a tree item.
+
+    These are written along with the stats cache, so that it can be restored
+    after being lost and cache misses can be served from the DB.
+    """
+
+    STATS_FIELDS = [
+        "total",
+        "translated",
+        "fuzzy",
+        "suggestions",
+        "critical",
+        "checks",
+        "last_action",
+        "last_updated",
+        "mtime",
+    ]
+
+    objects = TreeItemStatsManager()
+
+    pootle_path = models.CharField(max_length=255, unique=True, db_index=True)
+
+    total = models.IntegerField(null=True)
+    translated = models.IntegerField(null=True)
+    fuzzy = models.IntegerField(null=True)
+    suggestions = models.IntegerField(null=True)
+    critical = models.IntegerField(null=True)
+    # JSON-encoded counts keyed by check name
+    checks = models.TextField(null=True)
+    # JSON-encoded submission info
+    last_action = models.TextField(null=True)
+    last_updated = models.IntegerField(null=True)
+    # microseconds since the epoch; `datetime_min` is out of range for some
+    # DB backends
+    mtime = models.BigIntegerField(null=True)
+
+    def __str__(self):
+        return self.pootle_path
+
+    def get_values(self):
+        """Returns the persisted stats as a dict keyed by cached method name.
+        Missing values are `None`.
+        """
+        values = {name: None for name in CachedMethods.get_all()}
+
+        if self.total is not None:
+            values[str(CachedMethods.WORDCOUNT_STATS)] = {
+                "total": self.total,
+                "translated": self.translated,
+                "fuzzy": self.fuzzy,
+            }
+        values[str(CachedMethods.SUGGESTIONS)] = self.suggestions
+        if self.critical is not None:
+            values[str(CachedMethods.CHECKS)] = {
+                "unit_critical_error_count": self.critical,
+                "checks": json.loads(self.checks or "{}"),
+            }
+        if self.last_action is not None:
+            values[str(CachedMethods.LAST_ACTION)] = json.loads(self.last_action)
+        values[str(CachedMethods.LAST_UPDATED)] = self.last_updated
+        if self.mtime is not None:
+            values[str(CachedMethods.MTIME)] = make_aware(
+                EPOCH + datetime.timedelta(microseconds=self.mtime),
+                datetime.timezone.utc,
+            )
+
+        return values
+
+    def set_values(self, values, skip_none=True):
+        """Updates persisted stats out of a dict keyed by cached method name.
+
+        :param skip_none: whether `None` values should be ignored, or clear
+            the corresponding fields.
+        """
+        for name, value in values.items():
+            if value is None and skip_none:
+                continue
+
+            if name == str(CachedMethods.WORDCOUNT_STATS):
+                value = value or {}
+                self.total = value.get("total")
+                self.translated = value.get("translated")
+                self.fuzzy = value.get("fuzzy")
+            elif name == str(CachedMethods.SUGGESTIONS):
+                self.suggestions = value
+            elif name == str(CachedMethods.CHECKS):
+                self.critical = None
+                self.checks = None
+                if value is not None:
+                    self.critical = value.get("unit_critical_error_count", 0)
+                    self.checks = json.dumps(value.get("checks", {}))
+            elif name == str(CachedMethods.LAST_ACTION):
+                self.last_action = None
+                if value is not None:
+                    self.last_action = json.dumps(value, cls=DjangoJSONEncoder)
+            elif name == str(CachedMethods.LAST_UPDATED):
+                self.last_updated = value
+            elif name == str(CachedMethods.MTIME):
+                self.mtime = None
+                if value is not None:
+                    if value.tzinfo is not None:
+                        value = value.astimezone(datetime.timezone.utc)
+                    delta = value.replace(tzinfo=None) - EPOCH
+                    self.mtime = delta // datetime.timedelta(microseconds=1)
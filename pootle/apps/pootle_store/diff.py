@@ -7,17 +7,107 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
-import difflib
+from bisect import bisect_left
 from collections import OrderedDict
+from hashlib import blake2b
 
 from django.db import models
 from django.utils.functional import cached_property
 
+from pootle.core.utils.list import chunked
+from pootle.core.utils.multistring import SEPARATOR
+
 from .constants import FUZZY, OBSOLETE, TRANSLATED, UNTRANSLATED
 from .fields import to_python as multistring_to_python
 from .unit import UnitProxy
 
 
+#: Maximum number of units whose fingerprints are calculated in one go
+FINGERPRINT_CHUNK_SIZE = 500
+
+
+def get_fingerprint(unit):
+    """Returns a 64-bit fingerprint of the values of `unit` compared when
+    diffing stores (see `UnitDiffProxy.match_attrs`).
+
+    :param unit: a `Unit` or a `UnitDiffProxy`. Units whose values are equal
+        have equal fingerprints.
+    """
+    values = []
+    for k in UnitDiffProxy.match_attrs:
+        value = getattr(unit, k)
+        if k in ("source", "target"):
+            value = SEPARATOR.join(multistring_to_python(value).strings)
+        values.append(str(value or ""))
+    digest = blake2b("\0".join(values).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def get_matching_pairs(a, b):
+    """Returns the longest common subsequence of `a` and `b` as a list of
+    `(i, j)` index pairs, `a[i]` being equal to `b[j]`.
+
+    Items must be hashable and unique within each sequence, which makes
+    the problem equivalent to finding the longest increasing subsequence of
+    the positions in `b` of the items of `a`, solved in `O(n log n)`.
+    """
+    b_positions = {item: j for j, item in enumerate(b)}
+    pairs = [(i, b_positions[item]) for i, item in enumerate(a) if item in b_positions]
+
+    # `tails[k]`: index in `pairs` of the smallest `j` ending an increasing
+    # subsequence of length `k + 1`
+    tails = []
+    tail_js = []
+    predecessors = [None] * len(pairs)
+    for k, (i_, j) in enumerate(pairs):
+        length = bisect_left(tail_js, j)
+        if length > 0:
+            predecessors[k] = tails[length - 1]
+        if length == len(tails):
+            tails.append(k)
+            tail_js.append(j)
+        else:
+            tails[length] = k
+            tail_js[length] = j
+
+    matches = []
+    k = tails[-1] if tails else None
+    while k is not None:
+        matches.append(pairs[k])
+        k = predecessors[k]
+    matches.reverse()
+    return matches
+
+
+def get_opcodes(a, b):
+    """Returns opcodes describing how to turn `a` into `b`, in the same
+    format as `difflib.SequenceMatcher.get_opcodes()`.
+
+    Unlike `SequenceMatcher`, this takes `O(n log n)` time, but items must be
+    unique within each sequence (see `get_matching_pairs()`).
+    """
+    opcodes = []
+    i = j = 0
+    for i2, j2 in get_matching_pairs(a, b) + [(len(a), len(b))]:
+        if i < i2 and j < j2:
+            opcodes.append(("replace", i, i2, j, j2))
+        elif i < i2:
+            opcodes.append(("delete", i, i2, j, j))
+        elif j < j2:
+            opcodes.append(("insert", i, i, j, j2))
+
+        if i2 < len(a):
+            if opcodes and opcodes[-1][0] == "equal":
+                tag_, i1, i_, j1, j_ = opcodes.pop()
+                opcodes.append(("equal", i1, i2 + 1, j1, j2 + 1))
+            else:
+                opcodes.append(("equal", i2, i2 + 1, j2, j2 + 1))
+
+        i, j = i2 + 1, j2 + 1
+
+    return opcodes
+
+
 class UnitDiffProxy(UnitProxy):
     """Wraps File/DB Unit dicts used by StoreDiff for equality comparison"""
 
@@ -37,6 +127,10 @@ class UnitDiffProxy(UnitProxy):
     def __ne__(self, other):
         return not self == other
 
+    @property
+    def fingerprint(self):
+        return get_fingerprint(self)
+
 
 class DBUnit(UnitDiffProxy):
     pass
@@ -64,9 +158,11 @@ class FileStore(object):
 
     @cached_property
     def units(self):
-        """Returns all file units except the header."""
+        """Returns fingerprints of all file units except the header, keyed
+        by unit id.
+        """
         return OrderedDict(
-            (unit.getid(), self.get_file_unit(unit))
+            (unit.getid(), self.get_unit_fingerprint(unit))
             for unit in self.store.units
             if not unit.isheader()
         )
@@ -96,14 +192,25 @@ class FileStore(object):
             "translator_comment": unit.getnotes(origin="translator"),
         }
 
+    def get_unit_fingerprint(self, unit):
+        """Returns the fingerprint of a TTK `unit`."""
+        return FileUnit(self.get_file_unit(unit)).fingerprint
+
+    def get_fingerprint(self, id):
+        return self.units[id]
+
     def get_unit(self, id):
         """Retrieves a comparable `FileUnit` object by `id`."""
-        return FileUnit(self.units[id])
+        return FileUnit(self.get_file_unit(self.store.findid(id)))
 
 
 class DBStore(object):
     """DB store representation for diffing.
 
+    Only the fields needed to work out the changes, including the fingerprint
+    stored for every unit, are kept in memory. Full unit values are retrieved
+    on demand.
+
     :param store: the DB store to wrap
     :param only_active: whether to consider active units only
         (i.e. filter out obsolete units)
@@ -123,26 +230,71 @@ class DBStore(object):
         "context",
     )
 
+    #: Fields kept in memory for every unit
+    diff_fields = ("unitid", "state", "id", "index", "revision", "fingerprint")
+
     def __init__(self, store, only_active=False):
         self.store = store
         self.only_active = only_active
 
-    @cached_property
-    def units(self):
-        """Returns all DB units regardless of their state or revision."""
+    def get_queryset(self):
         qs = self.store.unit_set
         if self.only_active:
             qs = qs.live()
-        units = qs.values(*self.unit_fields).order_by("index")
-        return OrderedDict((unit["unitid"], unit) for unit in units)
+        return qs
+
+    @cached_property
+    def units(self):
+        """Returns diff fields of all DB units regardless of their state or
+        revision, keyed by unit id.
+
+        Missing fingerprints are calculated and stored.
+        """
+        units = OrderedDict()
+        missing = []
+        qs = self.get_queryset().values_list(*self.diff_fields).order_by("index")
+        for values in qs.iterator():
+            unit = dict(zip(self.diff_fields, values))
+            if unit["fingerprint"] is None:
+                missing.append(unit)
+            units[unit["unitid"]] = unit
+
+        for chunk in chunked(missing, FINGERPRINT_CHUNK_SIZE):
+            self.set_fingerprints(chunk)
+
+        return units
+
+    def set_fingerprints(self, units):
+        """Calculates fingerprints for `units` and stores them in the DB.
+
+        :param units: list of dicts of diff fields, updated in place.
+        """
+        units = {unit["id"]: unit for unit in units}
+        qs = self.store.unit_set.filter(id__in=units.keys())
+        for values in qs.values(*self.unit_fields):
+            units[values["id"]]["fingerprint"] = DBUnit(values).fingerprint
+
+        Unit = self.store.unit_set.model
+        Unit.objects.bulk_update(
+            [
+                Unit(id=pk, fingerprint=unit["fingerprint"])
+                for pk, unit in units.items()
+            ],
+            ["fingerprint"],
+        )
 
     @cached_property
     def active_uids(self):
         return [uid for uid, unit in self.units.items() if unit["state"] != OBSOLETE]
 
+    def get_fingerprint(self, id):
+        return self.units[id]["fingerprint"]
+
     def get_unit(self, id):
         """Retrieves a comparable `DBUnit` object by `id`."""
-        return DBUnit(self.units[id])
+        return DBUnit(
+            self.get_queryset().values(*self.unit_fields).get(id=self.units[id]["id"])
+        )
 
     def get_updated_uids(self, since_revision):
         """Return a list of *active* unit IDs that were updated since
@@ -160,6 +312,9 @@ class StoreDiff(object):
 
     Throughout this class, `source` always refers to a file store, whereas
     `target` refers to a DB store.
+
+    Units are compared by their fingerprints, so unchanged DB units don't
+    need to be loaded, and unit lists are diffed in `O(n log n)`.
     """
 
     def __init__(self, target_store, source_store, source_revision):
@@ -248,8 +403,7 @@ class StoreDiff(object):
 
     @cached_property
     def opcodes(self):
-        sm = difflib.SequenceMatcher(None, self.target.active_uids, self.new_unit_list)
-        return sm.get_opcodes()
+        return get_opcodes(self.target.active_uids, self.new_unit_list)
 
     def diff(self):
         """Return a dictionary of change actions or None if there are no
@@ -331,7 +485,8 @@ class StoreDiff(object):
                     for uid in self.target.active_uids[i1:i2]
                     if (
                         uid in self.source.units
-                        and self.source.get_unit(uid) != self.target.get_unit(uid)
+                        and self.source.get_fingerprint(uid)
+                        != self.target.get_fingerprint(uid)
                     )
                 )
             )
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.12 on 2026-10-18 20:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pootle_store", "0005_auto_20200124_0617"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="unit",
+            name="fingerprint",
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+    ]
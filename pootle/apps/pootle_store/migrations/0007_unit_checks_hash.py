@@ -0,0 +1,18 @@
+# Generated by Django 3.1.12 on 2026-10-18 21:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pootle_store", "0006_unit_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="unit",
+            name="checks_hash",
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.1.12 on 2026-10-18 21:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# `translate.filters.decorators.Category.CRITICAL`
+CRITICAL = 100
+
+
+def set_critical_checks(apps, schema_editor):
+    QualityCheck = apps.get_model("pootle_store", "QualityCheck")
+    Unit = apps.get_model("pootle_store", "Unit")
+
+    critical = (
+        QualityCheck.objects.filter(
+            unit=OuterRef("pk"), category=CRITICAL, false_positive=False
+        )
+        .order_by()
+        .values("unit")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    Unit.objects.filter(
+        id__in=QualityCheck.objects.filter(
+            category=CRITICAL, false_positive=False
+        ).values("unit_id")
+    ).update(critical_checks=Coalesce(Subquery(critical), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pootle_store", "0007_unit_checks_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="unit",
+            name="critical_checks",
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(set_critical_checks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+from pootle_store.unit.fulltext import (
+    create_unit_search_index,
+    drop_unit_search_index,
+)
+
+
+def create_index(apps, schema_editor):
+    create_unit_search_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    drop_unit_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pootle_store", "0008_unit_critical_checks"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
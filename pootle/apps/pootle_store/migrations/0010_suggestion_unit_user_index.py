@@ -0,0 +1,18 @@
+# Generated by Django 3.1.12 on 2026-10-19 00:41
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("pootle_store", "0009_unit_search_index"),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name="suggestion", index_together={("unit", "user")},
+        ),
+    ]
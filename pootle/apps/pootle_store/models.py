@@ -10,7 +10,7 @@
 import io
 import logging
 import operator
-from collections import OrderedDict
+from collections import Counter, OrderedDict
 from hashlib import md5
 from urllib.parse import quote
 
@@ -21,8 +21,9 @@ from translate.storage.factory import getobject
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import F
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.functional import cached_property
@@ -47,6 +48,7 @@ from pootle.core.log import (
 from pootle.core.mixins import CachedMethods, CachedTreeItem
 from pootle.core.models import Revision
 from pootle.core.search import SearchBroker
+from pootle.core.search.indexer import schedule_tm_update
 from pootle.core.storage import PootleFileSystemStorage
 from pootle.core.url_helpers import (
     get_editor_filter,
@@ -62,6 +64,7 @@ from pootle_misc.util import import_func
 from pootle_statistics.models import Submission, SubmissionFields, SubmissionTypes
 
 from .constants import FUZZY, NEW, OBSOLETE, PARSED, TRANSLATED, UNTRANSLATED
+from .diff import get_fingerprint
 from .fields import MultiStringField, TranslationStoreField
 from .managers import StoreManager, SuggestionManager, UnitManager
 from .syncer import PoStoreSyncer
@@ -103,7 +106,31 @@ class QualityCheck(models.Model):
     @classmethod
     def delete_unknown_checks(cls):
         unknown_checks = QualityCheck.objects.exclude(name__in=list(check_names.keys()))
+        unit_ids = list(
+            unknown_checks.filter(category=Category.CRITICAL)
+            .values_list("unit_id", flat=True)
+            .distinct()
+        )
         unknown_checks.delete()
+        if unit_ids:
+            update_critical_checks(Unit.simple_objects.filter(id__in=unit_ids))
+
+
+def update_critical_checks(units):
+    """Recalculates the number of active critical checks of `units`.
+
+    :param units: a `Unit` queryset.
+    """
+    critical = (
+        QualityCheck.objects.filter(
+            unit=OuterRef("pk"), category=Category.CRITICAL, false_positive=False
+        )
+        .order_by()
+        .values("unit")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    units.update(critical_checks=Coalesce(Subquery(critical), 0))
 
 
 # # # # # # # # # Suggestion # # # # # # # #
@@ -152,6 +179,11 @@ class Suggestion(models.Model, base.TranslationUnit):
 
     objects = SuggestionManager()
 
+    class Meta(object):
+        # units are matched by their users' suggestions through subqueries
+        # correlated with the units
+        index_together = [["unit", "user"]]
+
     # # # # # # # # # # # # # #  Properties # # # # # # # # # # # # # # # # # #
 
     @property
@@ -236,6 +268,15 @@ class Unit(models.Model, base.TranslationUnit):
     state = models.IntegerField(null=False, default=UNTRANSLATED, db_index=True)
     revision = models.IntegerField(null=False, default=0, db_index=True, blank=True)
 
+    # hash of the values compared when diffing stores, see `get_fingerprint()`
+    fingerprint = models.BigIntegerField(null=True, editable=False)
+    # hash of the values checks were last calculated for, see
+    # `pootle.core.checks.checker.get_checks_hash()`
+    checks_hash = models.BigIntegerField(null=True, editable=False)
+    # number of active critical checks, kept in sync with the unit's
+    # `QualityCheck`s, see `update_critical_checks()`
+    critical_checks = models.IntegerField(default=0, db_index=True, editable=False)
+
     # Metadata
     creation_time = models.DateTimeField(
         auto_now_add=True, db_index=True, editable=False, null=True
@@ -332,6 +373,11 @@ class Unit(models.Model, base.TranslationUnit):
         self._comment_updated = False
         self._auto_translated = False
         self._encoding = "UTF-8"
+        # cached stats whose changes `save()` will figure out by itself
+        # (see `ZING_STATS_DELTA_UPDATES`)
+        self._stats_tracked = set()
+        self._stats_old_checks = None
+        self._stats_suggestions = 0
 
     # should be called to flag the store cache for a deletion
     # before the unit will be deleted
@@ -370,13 +416,101 @@ class Unit(models.Model, base.TranslationUnit):
 
     def save(self, *args, **kwargs):
         created = self.id is None
+        delta_updates = settings.ZING_STATS_DELTA_UPDATES and self.store.state >= PARSED
+        if delta_updates:
+            # stats flagged by someone else need to be fully recalculated
+            stats_untracked = self.store._dirty_cache - self._stats_tracked
 
         if not hasattr(self, "_log_user"):
             User = get_user_model()
             self._log_user = User.objects.get_system_user()
         user = kwargs.pop("user", self._log_user)
 
-        if created:
+        revision = kwargs.pop("revision", None)
+        self.prepare_save(revision=revision)
+
+        if not created and hasattr(self, "_save_action"):
+            action_log(
+                user=self._log_user,
+                action=self._save_action,
+                lang=self.store.translation_project.language.code,
+                unit=self.id,
+                translation=self.target_f,
+                path=self.store.pootle_path,
+            )
+
+        if delta_updates:
+            old_state, old_wordcount = (None, 0)
+            if not created:
+                old_state, old_wordcount = (
+                    Unit.objects.filter(pk=self.pk)
+                    .values_list("state", "source_wordcount")
+                    .get()
+                )
+
+            old_checks = self._stats_old_checks
+            if created:
+                old_checks = {}
+            elif old_checks is None and (
+                self._source_updated
+                or self._target_updated
+                or (old_state > UNTRANSLATED) != (self.state > UNTRANSLATED)
+            ):
+                old_checks = self.get_active_check_categories()
+
+        super().save(*args, **kwargs)
+
+        if hasattr(self, "_save_action") and self._save_action == UNIT_ADDED:
+            # just added FUZZY unit
+            if self.state == FUZZY:
+                self.store.mark_dirty(CachedMethods.WORDCOUNT_STATS)
+
+            action_log(
+                user=self._log_user,
+                action=self._save_action,
+                lang=self.store.translation_project.language.code,
+                unit=self.id,
+                translation=self.target_f,
+                path=self.store.pootle_path,
+            )
+
+            self.add_initial_submission(user=user)
+
+        if self._source_updated or self._target_updated:
+            if not (created and self.state == UNTRANSLATED):
+                self.update_qualitychecks()
+            if self.istranslated():
+                self.update_tmserver()
+
+        # done processing source/target update remove flag
+        self._source_updated = False
+        self._target_updated = False
+        self._state_updated = False
+        self._comment_updated = False
+        self._auto_translated = False
+
+        # update cache only if we are updating a single unit
+        if self.store.state >= PARSED:
+            self.store.mark_dirty(CachedMethods.MTIME)
+            if delta_updates:
+                self.add_stats_delta(
+                    stats_untracked, old_state, old_wordcount, old_checks
+                )
+            self.store.update_dirty_cache()
+
+        self._stats_tracked = set()
+        self._stats_old_checks = None
+        self._stats_suggestions = 0
+
+    def prepare_save(self, revision=None):
+        """Updates the fields derived from the unit's source, target and state
+        ahead of writing it to the DB.
+
+        :param revision: revision to set for the unit, unless it was
+            auto-translated. If unset, a new revision is assigned only if
+            the unit changed.
+        """
+        if self.id is None:
             self._save_action = UNIT_ADDED
             self.store.mark_dirty(
                 CachedMethods.WORDCOUNT_STATS, CachedMethods.LAST_UPDATED
@@ -415,21 +549,11 @@ class Unit(models.Model, base.TranslationUnit):
         # a new value (the same for all units during its store updated)
         # since that change doesn't require further sync but note that
         # auto_translated units require further sync
-        revision = kwargs.pop("revision", None)
         if revision is not None and not self._auto_translated:
             self.revision = revision
         elif self._target_updated or self._state_updated or self._comment_updated:
             self.revision = Revision.incr()
-
-        if not created and hasattr(self, "_save_action"):
-            action_log(
-                user=self._log_user,
-                action=self._save_action,
-                lang=self.store.translation_project.language.code,
-                unit=self.id,
-                translation=self.target_f,
-                path=self.store.pootle_path,
-            )
+            self.store.record_unit_revision(self.revision)
 
         if (
             self._state_updated
@@ -453,41 +577,99 @@ class Unit(models.Model, base.TranslationUnit):
             self.submitted_by = None
             self.submitted_on = None
 
-        super().save(*args, **kwargs)
+        self.fingerprint = get_fingerprint(self)
 
-        if hasattr(self, "_save_action") and self._save_action == UNIT_ADDED:
-            # just added FUZZY unit
-            if self.state == FUZZY:
-                self.store.mark_dirty(CachedMethods.WORDCOUNT_STATS)
+    def add_stats_delta(self, untracked, old_state, old_wordcount, old_checks):
+        """Records the changes this unit brings to its store stats, so they
+        are applied in place instead of recalculating the store stats.
 
-            action_log(
-                user=self._log_user,
-                action=self._save_action,
-                lang=self.store.translation_project.language.code,
-                unit=self.id,
-                translation=self.target_f,
-                path=self.store.pootle_path,
-            )
+        :param untracked: cached method names which need to be recalculated
+            anyway; these are left alone.
+        :param old_state: unit state before saving (`None` for new units).
+        :param old_wordcount: unit source wordcount before saving.
+        :param old_checks: active checks before saving, as returned by
+            `get_active_check_categories()`, or `None` if they can't have
+            changed.
+        """
+        counters = Counter()
+        checks = Counter()
+        latest = {}
+        handled = set()
+
+        if str(CachedMethods.WORDCOUNT_STATS) not in untracked:
+            for state, wordcount, sign in (
+                (old_state, old_wordcount, -1),
+                (self.state, self.source_wordcount, 1),
+            ):
+                if state is None or state <= OBSOLETE:
+                    continue
+                counters["total"] += sign * wordcount
+                if state == TRANSLATED:
+                    counters["translated"] += sign * wordcount
+                elif state == FUZZY:
+                    counters["fuzzy"] += sign * wordcount
+            handled.add(CachedMethods.WORDCOUNT_STATS)
+
+        if str(CachedMethods.CHECKS) not in untracked:
+            if old_checks is not None:
+                before = {}
+                if old_state is not None and old_state > UNTRANSLATED:
+                    before = old_checks
+                after = {}
+                if self.state > UNTRANSLATED:
+                    after = self.get_active_check_categories()
+                checks.update(after.keys())
+                checks.subtract(before.keys())
+                counters["critical"] += int(Category.CRITICAL in after.values())
+                counters["critical"] -= int(Category.CRITICAL in before.values())
+            handled.add(CachedMethods.CHECKS)
+
+        if str(CachedMethods.SUGGESTIONS) not in untracked:
+            was_live = old_state is not None and old_state > OBSOLETE
+            is_live = self.state > OBSOLETE
+            if was_live and is_live:
+                counters["suggestions"] += self._stats_suggestions
+            elif was_live != is_live:
+                count = self.suggestion_set.pending().count()
+                if is_live:
+                    counters["suggestions"] += count
+                else:
+                    counters["suggestions"] -= count - self._stats_suggestions
+            handled.add(CachedMethods.SUGGESTIONS)
 
-            self.add_initial_submission(user=user)
+        if str(CachedMethods.MTIME) not in untracked:
+            latest[str(CachedMethods.MTIME)] = self.mtime
+            handled.add(CachedMethods.MTIME)
 
-        if self._source_updated or self._target_updated:
-            if not (created and self.state == UNTRANSLATED):
-                self.update_qualitychecks()
-            if self.istranslated():
-                self.update_tmserver()
+        if (
+            str(CachedMethods.LAST_UPDATED) not in untracked
+            and old_state is None
+            and self.creation_time
+        ):
+            latest[str(CachedMethods.LAST_UPDATED)] = self.get_last_updated_info()
+            handled.add(CachedMethods.LAST_UPDATED)
 
-        # done processing source/target update remove flag
-        self._source_updated = False
-        self._target_updated = False
-        self._state_updated = False
-        self._comment_updated = False
-        self._auto_translated = False
+        if (
+            str(CachedMethods.LAST_ACTION) not in untracked
+            and str(CachedMethods.LAST_ACTION) in self.store._dirty_cache
+        ):
+            sub = (
+                self.submission_set.exclude(type=SubmissionTypes.UNIT_CREATE)
+                .order_by("-creation_time", "-id")
+                .first()
+            )
+            if sub is not None:
+                latest[str(CachedMethods.LAST_ACTION)] = sub.get_submission_info()
+                handled.add(CachedMethods.LAST_ACTION)
 
-        # update cache only if we are updating a single unit
-        if self.store.state >= PARSED:
-            self.store.mark_dirty(CachedMethods.MTIME)
-            self.store.update_dirty_cache()
+        self.store.add_stats_delta(counters=counters, checks=checks, latest=latest)
+        self.store.unmark_dirty(*handled)
+
+    def track_stats(self, *args):
+        """Flags cached method names whose changes the next `save()` call
+        can account for by itself.
+        """
+        self._stats_tracked.update(str(key) for key in args)
 
     def get_absolute_url(self):
         return self.store.get_absolute_url()
@@ -712,6 +894,7 @@ class Unit(models.Model, base.TranslationUnit):
             if existing:
                 self.store.mark_dirty(CachedMethods.CHECKS)
                 self.qualitycheck_set.all().delete()
+                self.update_critical_checks()
                 return True
 
             return False
@@ -748,7 +931,19 @@ class Unit(models.Model, base.TranslationUnit):
             self.store.mark_dirty(CachedMethods.CHECKS)
             self.qualitycheck_set.filter(name__in=existing).delete()
 
-        return result or bool(unmute_list) or bool(existing)
+        result = result or bool(unmute_list) or bool(existing)
+        if result:
+            self.update_critical_checks()
+        return result
+
+    def update_critical_checks(self):
+        """Recalculates the number of active critical checks, both for this
+        instance and in the DB.
+        """
+        self.critical_checks = self.get_active_critical_qualitychecks().count()
+        Unit.simple_objects.filter(id=self.id).update(
+            critical_checks=self.critical_checks
+        )
 
     def get_qualitychecks(self):
         return self.qualitycheck_set.all()
@@ -765,6 +960,10 @@ class Unit(models.Model, base.TranslationUnit):
     def get_active_qualitychecks(self):
         return self.qualitycheck_set.filter(false_positive=False)
 
+    def get_active_check_categories(self):
+        """Returns a dict of active check categories keyed by check name."""
+        return dict(self.get_active_qualitychecks().values_list("name", "category"))
+
     # # # # # # # # # # # Related Submissions # # # # # # # # # # # #
 
     def get_edits(self):
@@ -782,6 +981,12 @@ class Unit(models.Model, base.TranslationUnit):
     # # # # # # # # # # # TranslationUnit # # # # # # # # # # # # # #
 
     def update_tmserver(self):
+        schedule_tm_update(
+            self.store.translation_project.language.code, [self.get_tm_data()]
+        )
+
+    def get_tm_data(self):
+        """Returns the data to index for this unit in the TM server."""
         obj = {
             "id": self.id,
             # 'revision' must be an integer for statistical queries to work
@@ -809,7 +1014,7 @@ class Unit(models.Model, base.TranslationUnit):
                 }
             )
 
-        get_tm_broker().update(self.store.translation_project.language.code, obj)
+        return obj
 
     def get_tm_suggestions(self):
         return get_tm_broker().search(self)
@@ -1004,6 +1209,8 @@ class Unit(models.Model, base.TranslationUnit):
 
             self.store.mark_dirty(CachedMethods.SUGGESTIONS, CachedMethods.LAST_ACTION)
             if touch:
+                self._stats_suggestions += 1
+                self.track_stats(CachedMethods.SUGGESTIONS, CachedMethods.LAST_ACTION)
                 self.save()
 
         return (suggestion, True)
@@ -1035,6 +1242,7 @@ class Unit(models.Model, base.TranslationUnit):
         if old_state != self.state:
             create_subs[SubmissionFields.STATE] = [old_state, self.state]
             self.store.mark_dirty(CachedMethods.WORDCOUNT_STATS)
+            self.track_stats(CachedMethods.WORDCOUNT_STATS)
         create_subs[SubmissionFields.TARGET] = [old_target, self.target]
 
         subs_created = []
@@ -1069,6 +1277,8 @@ class Unit(models.Model, base.TranslationUnit):
         self._log_user = reviewer
 
         self.store.mark_dirty(CachedMethods.SUGGESTIONS, CachedMethods.LAST_ACTION)
+        self._stats_suggestions -= 1
+        self.track_stats(CachedMethods.SUGGESTIONS, CachedMethods.LAST_ACTION)
         # Update timestamp
         self.save()
 
@@ -1090,6 +1300,8 @@ class Unit(models.Model, base.TranslationUnit):
         sub.save()
 
         self.store.mark_dirty(CachedMethods.SUGGESTIONS, CachedMethods.LAST_ACTION)
+        self._stats_suggestions -= 1
+        self.track_stats(CachedMethods.SUGGESTIONS, CachedMethods.LAST_ACTION)
         # Update timestamp
         self.save()
 
@@ -1102,10 +1314,16 @@ class Unit(models.Model, base.TranslationUnit):
         if check.false_positive == false_positive:
             return
 
+        if settings.ZING_STATS_DELTA_UPDATES:
+            self._stats_old_checks = self.get_active_check_categories()
+
         check.false_positive = false_positive
         check.save()
+        if check.category == Category.CRITICAL:
+            self.update_critical_checks()
 
         self.store.mark_dirty(CachedMethods.CHECKS, CachedMethods.LAST_ACTION)
+        self.track_stats(CachedMethods.CHECKS, CachedMethods.LAST_ACTION)
         self._log_user = user
         if false_positive:
             self._save_action = MUTE_QUALITYCHECK
@@ -1305,7 +1523,7 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
                 translation="",
                 path=self.pootle_path,
             )
-        unit_query.update(state=OBSOLETE, index=0)
+        unit_query.update(state=OBSOLETE, index=0, fingerprint=None)
         self.obsolete = True
         self.save()
         self.clear_cache()
@@ -1527,6 +1745,14 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
     def get_max_unit_revision(self):
         return max_column(self.unit_set.all(), "revision", 0)
 
+    def record_unit_revision(self, revision):
+        """Records `revision` as the one units in this store were last
+        changed at, once the current transaction is committed. This expires
+        cached unit searches covering the store.
+        """
+        pootle_path = self.pootle_path
+        transaction.on_commit(lambda: Revision.set_for_store(pootle_path, revision))
+
     # # # TreeItem
     def can_be_updated(self):
         return not self.obsolete
@@ -1558,30 +1784,21 @@ class Store(models.Model, CachedTreeItem, base.TranslationStore):
 
     def _get_checks(self):
         try:
-            queryset = QualityCheck.objects.filter(
-                unit__store=self, unit__state__gt=UNTRANSLATED, false_positive=False
-            )
-
-            queryset = queryset.values("unit", "name", "category").order_by(
-                "unit", "-category"
+            queryset = (
+                QualityCheck.objects.filter(
+                    unit__store=self, unit__state__gt=UNTRANSLATED, false_positive=False
+                )
+                .order_by()
+                .values("name")
+                .annotate(count=Count("id"))
             )
 
-            saved_unit = None
-            result = {
-                "unit_critical_error_count": 0,
-                "checks": {},
+            return {
+                "unit_critical_error_count": self.unit_set.filter(
+                    state__gt=UNTRANSLATED, critical_checks__gt=0
+                ).count(),
+                "checks": {item["name"]: item["count"] for item in queryset},
             }
-            for item in queryset:
-                if item["unit"] != saved_unit or saved_unit is None:
-                    saved_unit = item["unit"]
-                    if item["category"] == Category.CRITICAL:
-                        result["unit_critical_error_count"] += 1
-                if item["name"] in result["checks"]:
-                    result["checks"][item["name"]] += 1
-                else:
-                    result["checks"][item["name"]] = 1
-
-            return result
         except Exception as e:
             logging.info(u"Error getting quality checks for %s\n%s", self.name, e)
             return {}
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import logging
+
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+
+from pootle.core.mixins.treeitem import CachedMethods, get_empty_stats
+from pootle.core.utils import dateformat
+from pootle_statistics.models import Submission, SubmissionTypes
+
+from .constants import FUZZY, OBSOLETE, TRANSLATED, UNTRANSLATED
+from .models import QualityCheck, Store, Suggestion, Unit
+from .util import SuggestionStates
+
+
+logger = logging.getLogger("stats")
+
+
+def get_stores_stats(stores):
+    """Calculates the stats of several stores in one pass.
+
+    Instead of running the `Store._get_*` queries for every single store,
+    each metric is retrieved for all the stores at once with queries
+    grouped by store.
+
+    :param stores: a `Store` queryset, e.g. all the live stores of a
+        translation project or stores filtered by a list of ids.
+    :return: a dict of `{store_id: {cached_method_name: value}}`.
+    """
+    store_ids = list(stores.values_list("pk", flat=True))
+    stats = {store_id: get_empty_stats() for store_id in store_ids}
+    if not store_ids:
+        return stats
+
+    stores = Store.objects.filter(pk__in=stores.values("pk"))
+    units = Unit.objects.filter(store__in=stores).order_by()
+
+    wordcounts = (
+        units.filter(state__gt=OBSOLETE)
+        .values("store_id", "state")
+        .annotate(wordcount=Sum("source_wordcount"))
+    )
+    for item in wordcounts:
+        value = stats[item["store_id"]][str(CachedMethods.WORDCOUNT_STATS)]
+        value["total"] += item["wordcount"]
+        if item["state"] == TRANSLATED:
+            value["translated"] = item["wordcount"]
+        elif item["state"] == FUZZY:
+            value["fuzzy"] = item["wordcount"]
+
+    checks = QualityCheck.objects.filter(
+        unit__store__in=stores, unit__state__gt=UNTRANSLATED, false_positive=False,
+    ).order_by()
+    for item in checks.values("unit__store_id", "name").annotate(count=Count("id")):
+        value = stats[item["unit__store_id"]][str(CachedMethods.CHECKS)]
+        value["checks"][item["name"]] = item["count"]
+    critical = (
+        units.filter(state__gt=UNTRANSLATED, critical_checks__gt=0)
+        .values("store_id")
+        .annotate(count=Count("id"))
+    )
+    for item in critical:
+        value = stats[item["store_id"]][str(CachedMethods.CHECKS)]
+        value["unit_critical_error_count"] = item["count"]
+
+    suggestions = (
+        Suggestion.objects.filter(
+            unit__store__in=stores,
+            unit__state__gt=OBSOLETE,
+            state=SuggestionStates.PENDING,
+        )
+        .order_by()
+        .values("unit__store_id")
+        .annotate(count=Count("id"))
+    )
+    for item in suggestions:
+        stats[item["unit__store_id"]][str(CachedMethods.SUGGESTIONS)] = item["count"]
+
+    unit_times = units.values("store_id").annotate(
+        mtime=Max("mtime"), creation_time=Max("creation_time")
+    )
+    for item in unit_times:
+        value = stats[item["store_id"]]
+        if item["mtime"] is not None:
+            value[str(CachedMethods.MTIME)] = item["mtime"]
+        # creation_time field has been added recently, so it can have NULL
+        # value
+        if item["creation_time"] is not None:
+            value[str(CachedMethods.LAST_UPDATED)] = int(
+                dateformat.format(item["creation_time"], "U")
+            )
+
+    last_submission = (
+        Submission.simple_objects.filter(store_id=OuterRef("pk"))
+        .exclude(type=SubmissionTypes.UNIT_CREATE)
+        .order_by("-creation_time", "-pk")
+        .values("pk")[:1]
+    )
+    submission_ids = {
+        store_id: submission_id
+        for store_id, submission_id in stores.annotate(
+            last_submission=Subquery(last_submission)
+        ).values_list("pk", "last_submission")
+        if submission_id is not None
+    }
+    submissions = Submission.simple_objects.select_related(
+        "unit", "quality_check", "suggestion__reviewer", "submitter"
+    ).in_bulk(list(submission_ids.values()))
+    for store_id, submission_id in submission_ids.items():
+        stats[store_id][str(CachedMethods.LAST_ACTION)] = submissions[
+            submission_id
+        ].get_submission_info()
+
+    return stats
+
+
+def refresh_stores_stats(stores):
+    """Recalculates and caches the stats of `stores`, and schedules the
+    update of their parents' stats.
+
+    :param stores: a `Store` queryset.
+    """
+    stores = list(stores.select_related("parent", "translation_project"))
+    if not stores:
+        return
+
+    stats = get_stores_stats(Store.objects.filter(pk__in=[s.pk for s in stores]))
+    Store.set_many_cached_values({store: stats[store.pk] for store in stores})
+    logger.info("Updated stats for %d stores", len(stores))
+
+    parents = {}
+    for store in stores:
+        parent = store.get_parent()
+        parents[parent.cache_key] = parent
+    for parent in parents.values():
+        parent.update_all_cache()
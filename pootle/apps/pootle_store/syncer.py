@@ -24,6 +24,7 @@ from pootle.core.utils.timezone import datetime_min
 from pootle.core.utils.version import get_major_minor_version
 from pootle_statistics.models import Submission
 
+from .diff import FileStore
 from .util import get_change_str
 
 
@@ -344,11 +345,21 @@ class StoreSyncer(object):
             common_dbids &= self.get_modified_units(last_revision)
         return self.store.findid_bulk(list(common_dbids))
 
+    @cached_property
+    def file_store(self):
+        return FileStore(self.disk_store)
+
     def sync_units(self, units):
         updated = 0
         for unit in units:
             match = self.disk_store.findid(unit.getid())
             if match is not None:
+                # units with the same fingerprint have nothing to sync
+                if unit.fingerprint is not None and (
+                    unit.fingerprint == self.file_store.get_unit_fingerprint(match)
+                ):
+                    continue
+
                 changed = unit.sync(match)
                 if changed:
                     updated += 1
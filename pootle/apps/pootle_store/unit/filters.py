@@ -7,10 +7,17 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
-from django.db.models import Q
+import operator
+from functools import reduce
 
-from pootle_statistics.models import SubmissionTypes
+from translate.filters.decorators import Category
+
+from django.db.models import Exists, OuterRef, Q
+
+from pootle_statistics.models import Submission, SubmissionTypes
 from pootle_store.constants import FUZZY, TRANSLATED, UNTRANSLATED
+from pootle_store.models import QualityCheck, Suggestion
+from pootle_store.unit.fulltext import get_unit_search_index
 from pootle_store.util import SuggestionStates
 
 
@@ -35,18 +42,25 @@ class UnitChecksFilter(BaseUnitFilter):
         self.checks = kwargs.get("checks")
         self.category = kwargs.get("category")
 
+    def get_checks(self, **kwargs):
+        """Returns the failing checks of each unit matching `kwargs`, to be
+        used as a subquery correlated with the units.
+        """
+        return QualityCheck.objects.filter(
+            unit=OuterRef("pk"), false_positive=False, **kwargs
+        )
+
     def filter_checks(self):
         if self.checks:
-            return self.qs.filter(
-                qualitycheck__false_positive=False, qualitycheck__name__in=self.checks
-            ).distinct()
+            return self.qs.filter(Exists(self.get_checks(name__in=self.checks)))
+
+        if self.category == Category.CRITICAL:
+            return self.qs.filter(critical_checks__gt=0)
 
         if self.category:
-            return self.qs.filter(
-                qualitycheck__false_positive=False, qualitycheck__category=self.category
-            ).distinct()
+            return self.qs.filter(Exists(self.get_checks(category=self.category)))
 
-        return self.qs.filter(qualitycheck__false_positive=False,).distinct()
+        return self.qs.filter(Exists(self.get_checks()))
 
 
 class UnitStateFilter(BaseUnitFilter):
@@ -75,15 +89,39 @@ class UnitContributionFilter(BaseUnitFilter):
         super().__init__(qs, *args, **kwargs)
         self.user = kwargs.get("user")
 
+    def get_suggestions(self, **kwargs):
+        """Returns the suggestions of each unit matching `kwargs`, to be used
+        as a subquery correlated with the units.
+        """
+        return Suggestion.objects.filter(unit=OuterRef("pk"), **kwargs)
+
+    def get_submissions(self, **kwargs):
+        """Returns the edit submissions of each unit matching `kwargs`, to be
+        used as a subquery correlated with the units.
+        """
+        return Submission.objects.filter(
+            unit=OuterRef("pk"), type__in=SubmissionTypes.EDIT_TYPES, **kwargs
+        )
+
+    def get_contributions(self, unit_filter):
+        """Returns the suggestions or submissions units are matched by when
+        filtering by `unit_filter`, correlated with the units.
+        """
+        if unit_filter == "suggestions":
+            return self.get_suggestions(state=SuggestionStates.PENDING)
+        if unit_filter == "user-suggestions":
+            return self.get_suggestions(user=self.user, state=SuggestionStates.PENDING)
+        if unit_filter == "user-submissions":
+            return self.get_submissions()
+        raise FilterNotFound()
+
     def filter_suggestions(self):
-        return self.qs.filter(suggestion__state=SuggestionStates.PENDING).distinct()
+        return self.qs.filter(Exists(self.get_contributions("suggestions")))
 
     def filter_user_suggestions(self):
         if not self.user:
             return self.qs.none()
-        return self.qs.filter(
-            suggestion__user=self.user, suggestion__state=SuggestionStates.PENDING
-        ).distinct()
+        return self.qs.filter(Exists(self.get_contributions("user-suggestions")))
 
     def filter_my_suggestions(self):
         return self.filter_user_suggestions()
@@ -92,22 +130,26 @@ class UnitContributionFilter(BaseUnitFilter):
         if not self.user:
             return self.qs.none()
         return self.qs.filter(
-            suggestion__user=self.user, suggestion__state=SuggestionStates.ACCEPTED
-        ).distinct()
+            Exists(
+                self.get_suggestions(user=self.user, state=SuggestionStates.ACCEPTED)
+            )
+        )
 
     def filter_user_suggestions_rejected(self):
         if not self.user:
             return self.qs.none()
         return self.qs.filter(
-            suggestion__user=self.user, suggestion__state=SuggestionStates.REJECTED
-        ).distinct()
+            Exists(
+                self.get_suggestions(user=self.user, state=SuggestionStates.REJECTED)
+            )
+        )
 
     def filter_user_submissions(self):
         if not self.user:
             return self.qs.none()
         return self.qs.filter(
-            submitted_by=self.user, submission__type__in=SubmissionTypes.EDIT_TYPES
-        ).distinct()
+            Exists(self.get_contributions("user-submissions")), submitted_by=self.user
+        )
 
     def filter_my_submissions(self):
         return self.filter_user_submissions()
@@ -115,10 +157,8 @@ class UnitContributionFilter(BaseUnitFilter):
     def filter_user_submissions_overwritten(self):
         if not self.user:
             return self.qs.none()
-        qs = self.qs.filter(
-            submitted_by=self.user, submission__type__in=SubmissionTypes.EDIT_TYPES
-        )
-        return qs.exclude(submitted_by=self.user).distinct()
+        qs = self.filter_user_submissions()
+        return qs.exclude(submitted_by=self.user)
 
     def filter_my_submissions_overwritten(self):
         return self.filter_user_submissions_overwritten()
@@ -175,15 +215,19 @@ class UnitTextSearch(object):
         return [t.strip() for t in text.split(" ") if t.strip()]
 
     def search(self, text, sfields, exact=False):
-        result = self.qs.none()
         words = self.get_words(text, exact)
+        search_fields = self.get_search_fields(sfields)
+        if not search_fields:
+            return self.qs.none()
 
-        for k in self.get_search_fields(sfields):
-            result = result | self.search_field(k, words)
-        return result
+        qs = self.qs
+        index = get_unit_search_index(qs.db)
+        if index is not None:
+            qs = index.filter(qs, search_fields, words)
+
+        return qs.filter(
+            reduce(operator.or_, [self.search_field(k, words) for k in search_fields])
+        )
 
     def search_field(self, k, words):
-        subresult = self.qs
-        for word in words:
-            subresult = subresult.filter(**{("%s__icontains" % k): word})
-        return subresult
+        return Q(*[("%s__icontains" % k, word) for word in words])
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""Full-text index of unit texts.
+
+The index is native to the DB, and it's kept up to date by the DB itself
+whenever units are created, changed or deleted, regardless of how that
+happens. It's used to narrow down units before matching the actual text
+being searched, so searches don't need to scan every unit.
+"""
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.expressions import RawSQL
+
+
+__all__ = (
+    "create_unit_search_index",
+    "drop_unit_search_index",
+    "get_unit_search_index",
+    "repair_unit_search_index",
+)
+
+
+#: Unit fields covered by the index
+INDEXED_FIELDS = (
+    "source_f",
+    "target_f",
+    "locations",
+    "translator_comment",
+    "developer_comment",
+)
+
+UNIT_TABLE = "pootle_store_unit"
+
+
+class UnitSearchIndex(object):
+    """Full-text index of the `INDEXED_FIELDS` of units.
+
+    Looking up a word matches units containing it anywhere, not only as a
+    whole word, with no regard for case. Words shorter than
+    `min_word_length` can't be looked up.
+    """
+
+    name = "pootle_store_unit_search"
+    min_word_length = 1
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @classmethod
+    def is_supported(cls, connection):
+        """Whether the index can be created in the DB behind `connection`."""
+        return True
+
+    def exists(self):
+        raise NotImplementedError
+
+    def is_up_to_date(self):
+        """Whether the index is kept up to date with changes to units."""
+        return True
+
+    def create(self):
+        raise NotImplementedError
+
+    def repair(self):
+        """Makes the index be kept up to date again, and catches up with the
+        changes it missed.
+        """
+        pass
+
+    def drop(self):
+        raise NotImplementedError
+
+    def get_words(self, words):
+        """Returns the parts of `words` which can be looked up. Double quotes
+        aren't looked up, so words are split by them.
+        """
+        return [
+            part
+            for word in words
+            for part in word.split('"')
+            if len(part) >= self.min_word_length
+        ]
+
+    def filter(self, qs, fields, words):
+        """Narrows down the units in `qs` to the ones that may contain all of
+        `words` in any of `fields`.
+
+        Units are only narrowed down: the actual text still needs to be
+        matched against the units returned.
+        """
+        words = self.get_words(words)
+        if not words:
+            return qs
+
+        return self.filter_words(qs, fields, words)
+
+    def filter_words(self, qs, fields, words):
+        raise NotImplementedError
+
+
+class SQLiteUnitSearchIndex(UnitSearchIndex):
+    """FTS5 external content table which indexes trigrams of unit texts,
+    kept in sync through triggers.
+    """
+
+    name = "pootle_store_unit_fts"
+    min_word_length = 3
+
+    @classmethod
+    def is_supported(cls, connection):
+        # the trigram tokenizer was added in SQLite 3.34
+        if connection.Database.sqlite_version_info < (3, 34):
+            return False
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA compile_options")
+            return "ENABLE_FTS5" in [row[0] for row in cursor.fetchall()]
+
+    @property
+    def triggers(self):
+        return ["%s%s" % (self.name, suffix) for suffix in ("_ai", "_ad", "_au")]
+
+    def exists(self):
+        with self.connection.cursor() as cursor:
+            return self.name in self.connection.introspection.table_names(cursor)
+
+    def is_up_to_date(self):
+        # SQLite drops the triggers of a table whenever a migration rebuilds it
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master "
+                "WHERE type = 'trigger' AND tbl_name = %s",
+                [UNIT_TABLE],
+            )
+            triggers = {row[0] for row in cursor.fetchall()}
+
+        return triggers.issuperset(self.triggers)
+
+    def create(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE %s USING fts5(%s, content='%s', "
+                "content_rowid='id', tokenize='trigram')"
+                % (self.name, ", ".join(INDEXED_FIELDS), UNIT_TABLE)
+            )
+        self.create_triggers()
+        self.rebuild()
+
+    def create_triggers(self):
+        columns = ", ".join(INDEXED_FIELDS)
+        old_columns = ", ".join("old.%s" % field for field in INDEXED_FIELDS)
+        new_columns = ", ".join("new.%s" % field for field in INDEXED_FIELDS)
+        changed = " OR ".join(
+            "old.%s IS NOT new.%s" % (field, field) for field in INDEXED_FIELDS
+        )
+        context = {
+            "name": self.name,
+            "table": UNIT_TABLE,
+            "delete": "INSERT INTO %s (%s, rowid, %s) VALUES ('delete', old.id, %s);"
+            % (self.name, self.name, columns, old_columns),
+            "insert": "INSERT INTO %s (rowid, %s) VALUES (new.id, %s);"
+            % (self.name, columns, new_columns),
+            "changed": changed,
+        }
+
+        with self.connection.cursor() as cursor:
+            for statement in (
+                "CREATE TRIGGER IF NOT EXISTS %(name)s_ai AFTER INSERT ON %(table)s "
+                "BEGIN %(insert)s END",
+                "CREATE TRIGGER IF NOT EXISTS %(name)s_ad AFTER DELETE ON %(table)s "
+                "BEGIN %(delete)s END",
+                "CREATE TRIGGER IF NOT EXISTS %(name)s_au AFTER UPDATE ON %(table)s "
+                "WHEN %(changed)s BEGIN %(delete)s %(insert)s END",
+            ):
+                cursor.execute(statement % context)
+
+    def repair(self):
+        self.create_triggers()
+        self.rebuild()
+
+    def rebuild(self):
+        """Rebuilds the index from the current contents of units."""
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO %s (%s) VALUES ('rebuild')" % (self.name, self.name)
+            )
+
+    def drop(self):
+        with self.connection.cursor() as cursor:
+            for trigger in self.triggers:
+                cursor.execute("DROP TRIGGER IF EXISTS %s" % trigger)
+            cursor.execute("DROP TABLE IF EXISTS %s" % self.name)
+
+    def filter_words(self, qs, fields, words):
+        words = " AND ".join('"%s"' % word for word in words)
+        query = " OR ".join(
+            "({%s} : (%s))" % (field, words)
+            for field in fields
+            if field in INDEXED_FIELDS
+        )
+        return qs.filter(
+            id__in=RawSQL(
+                "SELECT rowid FROM %s WHERE %s MATCH %%s" % (self.name, self.name),
+                [query],
+            )
+        )
+
+
+class MySQLUnitSearchIndex(UnitSearchIndex):
+    """InnoDB FULLTEXT index built with the ngram parser.
+
+    Words shorter than `ngram_token_size` (2 by default) can't be looked up,
+    and ngrams including stopwords aren't indexed, so the server should run
+    with `innodb_ft_enable_stopword = OFF`.
+    """
+
+    min_word_length = 2
+
+    def exists(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() "
+                "AND table_name = %s AND index_name = %s",
+                [UNIT_TABLE, self.name],
+            )
+            return cursor.fetchone() is not None
+
+    def create(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "ALTER TABLE `%s` ADD FULLTEXT INDEX `%s` (%s) WITH PARSER ngram"
+                % (
+                    UNIT_TABLE,
+                    self.name,
+                    ", ".join("`%s`" % field for field in INDEXED_FIELDS),
+                )
+            )
+
+    def drop(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE `%s` DROP INDEX `%s`" % (UNIT_TABLE, self.name))
+
+    def filter_words(self, qs, fields, words):
+        # `MATCH()` must list the same columns as the index, so units
+        # containing the words across different fields are also returned
+        return qs.extra(
+            where=[
+                "MATCH (%s) AGAINST (%%s IN BOOLEAN MODE)"
+                % ", ".join(
+                    "`%s`.`%s`" % (UNIT_TABLE, field) for field in INDEXED_FIELDS
+                )
+            ],
+            params=[" ".join('+"%s"' % word for word in words)],
+        )
+
+
+#: Index implementations per DB vendor
+UNIT_SEARCH_INDEXES = {
+    "sqlite": SQLiteUnitSearchIndex,
+    "mysql": MySQLUnitSearchIndex,
+}
+
+_indexes = {}
+
+
+def get_index(connection):
+    index_class = UNIT_SEARCH_INDEXES.get(connection.vendor)
+    if index_class is None or not index_class.is_supported(connection):
+        return None
+
+    return index_class(connection)
+
+
+def get_unit_search_index(using=DEFAULT_DB_ALIAS):
+    """Returns the unit search index of the `using` DB, or `None` if it has
+    none or if the index isn't up to date.
+    """
+    if using not in _indexes:
+        index = get_index(connections[using])
+        if index is not None and not (index.exists() and index.is_up_to_date()):
+            index = None
+        _indexes[using] = index
+
+    return _indexes[using]
+
+
+def create_unit_search_index(connection):
+    """Creates and fills in the unit search index, if the DB behind
+    `connection` supports one.
+    """
+    index = get_index(connection)
+    if index is not None and not index.exists():
+        index.create()
+    _indexes.pop(connection.alias, None)
+
+
+def drop_unit_search_index(connection):
+    """Drops the unit search index, if any."""
+    index = get_index(connection)
+    if index is not None and index.exists():
+        index.drop()
+    _indexes.pop(connection.alias, None)
+
+
+def repair_unit_search_index(connection):
+    """Repairs the unit search index, if it exists and isn't up to date.
+
+    Meant to be run after migrations, which may leave the index out of date
+    by rebuilding the units table.
+    """
+    index = get_index(connection)
+    if index is not None and index.exists() and not index.is_up_to_date():
+        index.repair()
+    _indexes.pop(connection.alias, None)
@@ -7,20 +7,41 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
-from django.db.models import Max
+import json
+from hashlib import md5
+
+from django.core.cache import cache
+from django.db import connections, models
+from django.db.models import Q, Subquery
 from django.utils.functional import cached_property
 
+from pootle.core.models import Revision
 from pootle_store.constants import SIMPLY_SORTED
 from pootle_store.models import Unit
-from pootle_store.unit.filters import UnitSearchFilter, UnitTextSearch
+from pootle_store.unit.filters import (
+    UnitContributionFilter,
+    UnitSearchFilter,
+    UnitTextSearch,
+)
 
 
 MAX_RESULTS = 500
+#: Number of results preceding a requested unit which are counted right away
+#: to tell its position, further positions are cached
+MAX_COUNTED_POSITION = 5000
+
+#: Number of seconds search results are cached for
+CACHE_TIMEOUT = 120
+#: Search parameters which don't affect the results
+UNCACHED_PARAMS = ("count", "initial", "uid", "uids")
+#: Filters whose results are cached. Other filters depend on suggestions or
+#: quality checks, which change without bumping unit revisions
+CACHED_FILTERS = ("all", "translated", "untranslated", "fuzzy", "incomplete")
 
 
 class DBSearchBackend(object):
 
-    default_order = "store__pootle_path", "index"
+    default_order = "store__pootle_path", "index", "pk"
     select_related = (
         "store__translation_project__project",
         "store__translation_project__language",
@@ -86,21 +107,38 @@ class DBSearchBackend(object):
             .select_related(*self.select_related)
         )
 
+    def get_sort_fields(self):
+        """Returns the fields results are sorted by, as a list of
+        `(field, descending)` tuples.
+        """
+        sort_fields = [(field, False) for field in self.default_order]
+        if self.unit_filter and self.sort_by is not None:
+            field = self.sort_by.lstrip("-")
+            if self.sort_on not in SIMPLY_SORTED:
+                field = "sort_by_field"
+            sort_fields.insert(0, (field, self.sort_by[0] == "-"))
+        return sort_fields
+
     def sort_qs(self, qs):
         if self.unit_filter and self.sort_by is not None:
-            sort_by = self.sort_by
             if self.sort_on not in SIMPLY_SORTED:
-                # Omit leading `-` sign
-                if self.sort_by[0] == "-":
-                    max_field = self.sort_by[1:]
-                    sort_by = "-sort_by_field"
-                else:
-                    max_field = self.sort_by
-                    sort_by = "sort_by_field"
-                # It's necessary to use `Max()` here because we can't
-                # use `distinct()` and `order_by()` at the same time
-                qs = qs.annotate(sort_by_field=Max(max_field))
-            return qs.order_by(sort_by, "store__pootle_path", "index")
+                # Units are sorted by the latest of the contributions they
+                # were filtered by, which is looked up through a subquery
+                contributions = UnitContributionFilter(
+                    qs, user=self.kwargs.get("user")
+                ).get_contributions(self.unit_filter)
+                field = self.sort_by.lstrip("-").split("__")[-1]
+                qs = qs.annotate(
+                    sort_by_field=Subquery(
+                        contributions.order_by("-%s" % field).values(field)[:1]
+                    )
+                )
+            return qs.order_by(
+                *[
+                    "-%s" % field if descending else field
+                    for field, descending in self.get_sort_fields()
+                ]
+            )
         return qs
 
     def filter_qs(self, qs):
@@ -119,9 +157,7 @@ class DBSearchBackend(object):
             )
 
             if month is not None:
-                qs = qs.filter(
-                    submitted_on__gte=month[0], submitted_on__lte=month[1]
-                ).distinct()
+                qs = qs.filter(submitted_on__gte=month[0], submitted_on__lte=month[1])
 
         if sfields and search:
             qs = UnitTextSearch(qs).search(search, sfields, exact=exact)
@@ -140,32 +176,197 @@ class DBSearchBackend(object):
 
         return total, start, end, self.results[start:end]
 
-    def get_uids(self):
-        total = self.results.count()
+    def get_revision(self):
+        """Returns the revision units within the searched path were last
+        changed at.
+        """
+        if self.language_code and self.project_code:
+            path = "/%s/%s/" % (self.language_code, self.project_code)
+        elif self.language_code:
+            path = "/%s/" % self.language_code
+        elif self.project_code:
+            path = "/projects/%s/" % self.project_code
+        else:
+            return Revision.get()
+
+        return Revision.get_for_path(path)
+
+    def get_cache_key(self, name):
+        """Returns the key `name` is cached with for this search. Keys change
+        whenever units within the searched path change.
+        """
+
+        def normalize(value):
+            if isinstance(value, models.Model):
+                return value.pk
+            if isinstance(value, (list, tuple, set)):
+                return sorted(str(item) for item in value)
+            return value
+
+        params = {
+            key: normalize(value)
+            for key, value in self.kwargs.items()
+            if key not in UNCACHED_PARAMS
+        }
+        params["request_user"] = normalize(self.request_user)
+        params_hash = md5(
+            json.dumps(
+                [self.get_revision(), params], sort_keys=True, default=str
+            ).encode("utf-8")
+        )
+        return "pootle:search:%s:%s" % (name, params_hash.hexdigest())
+
+    @property
+    def is_cached(self):
+        """Whether results are cached, see `CACHED_FILTERS`."""
+        return not self.unit_filter or self.unit_filter in CACHED_FILTERS
+
+    def get_total(self):
+        """Returns the number of results, which is cached for a while."""
+        if not self.is_cached:
+            return self.results.count()
+
+        key = self.get_cache_key("total")
+        total = cache.get(key)
+        if total is None:
+            total = self.results.count()
+            cache.set(key, total, CACHE_TIMEOUT)
+        return total
+
+    def get_keyset_filter(self, values, after):
+        """Returns a filter matching the results sorted before or after the
+        one whose sort fields have `values`.
+
+        :param values: values of the fields returned by `get_sort_fields()`.
+        :param after: whether to match results sorted after or before.
+        """
+        nulls_largest = connections[self.results.db].features.nulls_order_largest
+
+        keyset_filter = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(self.get_sort_fields(), values):
+            if after != descending:
+                lookup, nulls_match = "gt", nulls_largest
+            else:
+                lookup, nulls_match = "lt", not nulls_largest
+
+            if value is None:
+                if not nulls_match:
+                    keyset_filter |= equal & Q(**{"%s__isnull" % field: False})
+                equal &= Q(**{"%s__isnull" % field: True})
+                continue
+
+            field_filter = Q(**{"%s__%s" % (field, lookup): value})
+            if nulls_match:
+                field_filter |= Q(**{"%s__isnull" % field: True})
+            keyset_filter |= equal & field_filter
+            equal &= Q(**{field: value})
+
+        return keyset_filter
+
+    def iter_results(self, fields, chunk_size):
+        """Yields the values of `fields` for all the results, in lists of up
+        to `chunk_size` rows.
+
+        Results are paged through by their sort fields, so each chunk is read
+        with a query of its own that is bounded by `chunk_size`.
+        """
+        sort_fields = [field for field, descending_ in self.get_sort_fields()]
+        qs = self.results.values_list(*sort_fields, *fields)
+
+        values = None
+        while True:
+            chunk_qs = qs
+            if values is not None:
+                chunk_qs = qs.filter(self.get_keyset_filter(values, after=True))
+            rows = list(chunk_qs[:chunk_size])
+            if rows:
+                yield [row[len(sort_fields) :] for row in rows]
+            if len(rows) < chunk_size:
+                return
+            values = rows[-1][: len(sort_fields)]
+
+    def get_uids_window(self, uid, before, after):
+        """Returns the uids of the results around the one for `uid`, without
+        going through the results preceding them.
+
+        :param before: maximum number of results to return before `uid`.
+        :param after: maximum number of results to return from `uid` on.
+            Any room left by results missing before `uid` is also used.
+        :return: a tuple of the position of the first result returned and
+            the list of `(uid, store_id)` tuples of the results, or `None` if
+            `uid` is not in the results.
+        """
+        fields = [field for field, descending_ in self.get_sort_fields()]
+        values = self.results.filter(pk=uid).values_list(*fields).first()
+        if values is None:
+            return None
+
+        before_qs = self.results.filter(self.get_keyset_filter(values, after=False))
+        uids_before = list(before_qs.reverse().values_list("pk", "store_id")[:before])
+        uids_before.reverse()
+        uids_after = list(
+            self.results.filter(
+                self.get_keyset_filter(values, after=True) | Q(pk=uid)
+            ).values_list("pk", "store_id")[: before + after - len(uids_before)]
+        )
 
+        begin = 0
+        if len(uids_before) == before:
+            begin = self.get_position(uid, before_qs) - before
+        return begin, uids_before + uids_after
+
+    def get_position(self, uid, before_qs):
+        """Returns the number of results sorted before the one for `uid`.
+
+        Counting every preceding result gets slow deep into large result
+        sets, so positions past `MAX_COUNTED_POSITION` are cached for a
+        while, even for filters whose results aren't: they may be slightly
+        off, but only serve to tell users where they are.
+
+        :param before_qs: queryset of the results sorted before `uid`.
+        """
+        position = before_qs[:MAX_COUNTED_POSITION].count()
+        if position < MAX_COUNTED_POSITION:
+            return position
+
+        key = self.get_cache_key("position:%s" % uid)
+        position = cache.get(key)
+        if position is None:
+            position = before_qs.count()
+            cache.set(key, position, CACHE_TIMEOUT)
+        return position
+
+    def get_uids(self):
+        """Returns the window of results around the requested unit, which is
+        cached for a while along with the total number of results.
+        """
+        if not self.is_cached:
+            return self.find_uids()
+
+        key = self.get_cache_key("uids:%s" % self.uid)
+        uids = cache.get(key)
+        if uids is None:
+            uids = self.find_uids()
+            cache.set(key, uids, CACHE_TIMEOUT)
+        return uids
+
+    def find_uids(self):
+        total = self.get_total()
         begin = 0
         end = min(MAX_RESULTS, total)
 
+        # If there are more results than MAX_RESULTS, and if we're requesting
+        # a specific unit, look up the ones around it by their sort fields so
+        # that the requested unit is in the middle.
         uids = None
-
-        # If there are more results than MAX_RESULTS, and if we're
-        # requesting a specific unit in a specific store, adjust the
-        # results window so that the requested unit is in the middle.
-
-        if (
-            total > MAX_RESULTS
-            and self.language_code
-            and self.project_code
-            and self.filename
-            and self.uid
-        ):
-            # find the uid in the Store
-            uid_results = list(self.results.values_list("pk", "store_id"))
-            uid_list = [result[0] for result in uid_results]
-            if self.uid in uid_list:
-                begin = max(uid_list.index(self.uid) - MAX_RESULTS // 2, 0)
-                end = min(begin + MAX_RESULTS, total)
-                uids = uid_results[begin:end]
+        if total > MAX_RESULTS and self.uid:
+            window = self.get_uids_window(
+                self.uid, MAX_RESULTS // 2, MAX_RESULTS - MAX_RESULTS // 2
+            )
+            if window is not None:
+                begin, uids = window
+                end = begin + len(uids)
 
         if not uids:
             uids = list(self.results[begin:end].values_list("pk", "store_id"))
@@ -9,18 +9,28 @@
 
 import logging
 
+from translate.filters.decorators import Category
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.utils.functional import cached_property
 
-from pootle.core.log import log
+from pootle.core.log import UNIT_ADDED, UNIT_OBSOLETE, action_log, log
+from pootle.core.mixins import CachedMethods
 from pootle.core.models import Revision
+from pootle.core.search.indexer import schedule_tm_update
+from pootle.core.utils.list import chunked
 
-from .constants import OBSOLETE, PARSED
+from .constants import OBSOLETE, PARSED, UNTRANSLATED
 from .diff import StoreDiff
 from .util import get_change_str
 
 
+#: Maximum number of rows written by a single bulk `INSERT`
+BULK_CHUNK_SIZE = 500
+
+
 class StoreUpdate(object):
     """Wraps either a db or file store with instructions for updating
     a target db store
@@ -255,7 +265,14 @@ class StoreUpdater(object):
             unit.store = self.target_store
             yield unit
 
-    def update(self, store, user=None, store_revision=None, submission_type=None):
+    def update(
+        self,
+        store,
+        user=None,
+        store_revision=None,
+        submission_type=None,
+        update_cache=True,
+    ):
         logging.debug(u"Updating %s", self.target_store.pootle_path)
         old_state = self.target_store.state
 
@@ -279,8 +296,9 @@ class StoreUpdater(object):
             else:
                 self.target_store.state = old_state
             has_changed = any(x > 0 for x in changes.values())
-            self.target_store.save(update_cache=has_changed)
+            self.target_store.save(update_cache=update_cache and has_changed)
             if has_changed:
+                self.target_store.record_unit_revision(update_revision)
                 log(
                     u"[update] %s units in %s [revision: %d]"
                     % (
@@ -302,16 +320,24 @@ class StoreUpdater(object):
             self.target_store.update_index(start=start, delta=delta)
 
         # Add new units
-        for unit, new_unit_index in to_change["add"]:
-            self.target_store.addunit(
-                unit, new_unit_index, user=user, update_revision=update_revision,
-            )
+        if len(to_change["add"]) >= settings.ZING_BULK_UPDATE_THRESHOLD:
+            self.add_units_bulk(to_change["add"], user, update_revision)
+        else:
+            for unit, new_unit_index in to_change["add"]:
+                self.target_store.addunit(
+                    unit, new_unit_index, user=user, update_revision=update_revision,
+                )
         changes["added"] = len(to_change["add"])
 
         # Obsolete units
-        changes["obsoleted"] = self.target_store.mark_units_obsolete(
-            to_change["obsolete"], update_revision,
-        )
+        if len(to_change["obsolete"]) >= settings.ZING_BULK_UPDATE_THRESHOLD:
+            changes["obsoleted"] = self.mark_units_obsolete_bulk(
+                to_change["obsolete"], update_revision,
+            )
+        else:
+            changes["obsoleted"] = self.target_store.mark_units_obsolete(
+                to_change["obsolete"], update_revision,
+            )
 
         # Update units
         update_dbids, uid_index_map = to_change["update"]
@@ -328,13 +354,167 @@ class StoreUpdater(object):
         changes.update({"updated": updated, "suggested": suggested})
         return changes, unsynced_uids
 
-    def update_from_disk(self, force=False, overwrite=False):
+    def add_units_bulk(self, to_add, user, update_revision):
+        """Adds new units to the store, writing them along with their initial
+        submissions and quality checks with bulk `INSERT`s.
+
+        The outcome is the same as calling `Store.addunit()` for every unit,
+        but stats are marked as dirty for the caller to recalculate them
+        once, and translations are sent to the TM server in one batch.
+
+        :param to_add: list of `(unit, index)` tuples, where `unit` is a TTK
+            unit and `index` the index to insert it at.
+        :param user: User to attribute the new units to.
+        :param update_revision: revision to set for the new units.
+        """
+        from pootle_statistics.models import (
+            Submission,
+            SubmissionFields,
+            SubmissionTypes,
+        )
+
+        from .models import QualityCheck, update_critical_checks
+
+        store = self.target_store
+        now = timezone.now()
+
+        units = []
+        for unit, index in to_add:
+            newunit = store.UnitClass(store=store, index=index)
+            newunit.update(unit, user=user)
+            if newunit._target_updated or newunit.istranslated():
+                newunit.submitted_by = user
+                newunit.submitted_on = now
+            newunit.prepare_save(revision=update_revision)
+            units.append(newunit)
+
+        # IDs aren't set by `bulk_create()` on all DB backends: retrieve them
+        # by the unique `(store, unitid_hash)` pair
+        for chunk in chunked(units, BULK_CHUNK_SIZE):
+            store.unit_set.bulk_create(chunk)
+            ids = dict(
+                store.unit_set.filter(
+                    unitid_hash__in=[unit.unitid_hash for unit in chunk]
+                ).values_list("unitid_hash", "id")
+            )
+            for unit in chunk:
+                unit.id = ids[unit.unitid_hash]
+
+        lang = store.translation_project.language.code
+        checker = store.translation_project.checker
+        submissions = []
+        checks = []
+        tm_data = []
+        for unit in units:
+            action_log(
+                user="system",
+                action=UNIT_ADDED,
+                lang=lang,
+                unit=unit.id,
+                translation=unit.target_f,
+                path=store.pootle_path,
+            )
+
+            if unit.istranslated() or unit.isfuzzy():
+                submissions.append(
+                    Submission(
+                        creation_time=unit.creation_time,
+                        translation_project_id=store.translation_project_id,
+                        submitter=user,
+                        unit=unit,
+                        store_id=store.id,
+                        type=SubmissionTypes.UNIT_CREATE,
+                        field=SubmissionFields.TARGET,
+                        new_value=unit.target,
+                    )
+                )
+
+            if unit.state != UNTRANSLATED and unit.target:
+                qc_failures = checker.run_filters(unit, categorised=True)
+                for name, failure in qc_failures.items():
+                    checks.append(
+                        QualityCheck(
+                            unit=unit,
+                            name=name,
+                            message=failure["message"],
+                            category=failure["category"],
+                        )
+                    )
+
+            if unit.istranslated():
+                tm_data.append(unit.get_tm_data())
+
+        for chunk in chunked(submissions, BULK_CHUNK_SIZE):
+            Submission.objects.bulk_create(chunk)
+        for chunk in chunked(checks, BULK_CHUNK_SIZE):
+            QualityCheck.objects.bulk_create(chunk)
+        critical_ids = {
+            check.unit.id for check in checks if check.category == Category.CRITICAL
+        }
+        for chunk in chunked(critical_ids, BULK_CHUNK_SIZE):
+            update_critical_checks(store.unit_set.filter(id__in=chunk))
+        schedule_tm_update(lang, tm_data)
+
+        store.mark_dirty(
+            CachedMethods.WORDCOUNT_STATS,
+            CachedMethods.CHECKS,
+            CachedMethods.LAST_ACTION,
+            CachedMethods.LAST_UPDATED,
+            CachedMethods.MTIME,
+        )
+
+    def mark_units_obsolete_bulk(self, uids_to_obsolete, update_revision=None):
+        """Marks a bulk of units as obsolete with a single `UPDATE`.
+
+        The outcome is the same as `Store.mark_units_obsolete()`, but stats
+        are marked as dirty for the caller to recalculate them once.
+
+        :param uids_to_obsolete: UIDs of the units to be marked as obsolete.
+        :param update_revision: revision to set for the obsoleted units.
+        :return: The number of units marked as obsolete.
+        """
+        store = self.target_store
+        if update_revision is None:
+            update_revision = Revision.incr()
+
+        lang = store.translation_project.language.code
+        obsoleted = 0
+        for chunk in chunked(uids_to_obsolete, BULK_CHUNK_SIZE):
+            unit_query = store.unit_set.filter(id__in=chunk, state__gt=OBSOLETE)
+            for unit_id, target in unit_query.values_list("id", "target_f"):
+                action_log(
+                    user="system",
+                    action=UNIT_OBSOLETE,
+                    lang=lang,
+                    unit=unit_id,
+                    translation=target,
+                    path=store.pootle_path,
+                )
+            # fingerprints are recalculated the next time they are needed
+            obsoleted += unit_query.update(
+                state=OBSOLETE,
+                index=0,
+                revision=update_revision,
+                mtime=timezone.now(),
+                fingerprint=None,
+            )
+
+        if obsoleted:
+            store.mark_dirty(*CachedMethods.get_all())
+            store.record_unit_revision(update_revision)
+
+        return obsoleted
+
+    def update_from_disk(self, force=False, overwrite=False, update_cache=True):
         """Update DB with units from the disk file.
 
         :param force: uncondintionally process store (even if it appears
             unchanged on disk).
         :param overwrite: process all units from the file regardless of
             `last_sync_revision`.
+        :param update_cache: whether to schedule the update of the store's
+            cached stats if it changed. Callers updating stores in bulk can
+            disable this and refresh the stats of all stores at once.
         :return: boolean, whether the DB store has been changed or not.
         """
         if not self.target_store.file:
@@ -357,7 +537,9 @@ class StoreUpdater(object):
 
         # update the units
         update_revision, changes, unsynced_uids = self.update(
-            self.target_store.file.store, store_revision=store_revision
+            self.target_store.file.store,
+            store_revision=store_revision,
+            update_cache=update_cache,
         )
 
         # update file_mtime
@@ -11,7 +11,6 @@ import logging
 
 from translate.misc.lru import LRUCachingDict
 
-from django.conf import settings
 from django.db import models
 from django.urls import reverse
 from django.utils.functional import cached_property
@@ -26,10 +25,11 @@ from pootle_app.project_tree import (
     translation_project_dir_exists,
 )
 from pootle_language.models import Language
-from pootle_misc.checks import excluded_filters
+from pootle_misc.checks import get_checker
 from pootle_project.models import Project
 from pootle_store.constants import PARSED
 from pootle_store.models import Store
+from pootle_store.stats import refresh_stores_stats
 from pootle_store.util import absolute_real_path, relative_real_path
 
 
@@ -215,27 +215,7 @@ class TranslationProject(models.Model, CachedTreeItem):
 
     @property
     def checker(self):
-        from translate.filters import checks
-
-        # We do not use default Translate Toolkit checkers; instead use
-        # our own one
-        if settings.ZING_QUALITY_CHECKER:
-            from pootle_misc.util import import_func
-
-            checkerclasses = [import_func(settings.ZING_QUALITY_CHECKER)]
-        else:
-            checkerclasses = [
-                checks.projectcheckers.get(
-                    self.project.checkstyle, checks.StandardChecker
-                )
-            ]
-
-        return checks.TeeChecker(
-            checkerclasses=checkerclasses,
-            excludefilters=excluded_filters,
-            errorhandler=self.filtererrorhandler,
-            languagecode=self.language.code,
-        )
+        return get_checker(self.project.checkstyle, self.language.code)
 
     @property
     def non_db_state(self):
@@ -296,10 +276,6 @@ class TranslationProject(models.Model, CachedTreeItem):
             ]
         )
 
-    def filtererrorhandler(self, functionname, str1, str2, e):
-        logging.error(u"Error in filter %s: %r, %r, %s", functionname, str1, str2, e)
-        return False
-
     def is_accessible_by(self, user):
         """Returns `True` if the current translation project is accessible
         by `user`.
@@ -324,15 +300,20 @@ class TranslationProject(models.Model, CachedTreeItem):
         self.scan_files()
 
         stores = self.stores.live().select_related("parent").exclude(file="")
+        changed_stores = []
         # Update store content from disk store
         for store in stores.iterator():
-            changed = (
-                store.updater.update_from_disk(force=force, overwrite=overwrite)
-                or changed
-            )
-
+            if store.updater.update_from_disk(
+                force=force, overwrite=overwrite, update_cache=False
+            ):
+                changed_stores.append(store.pk)
+        changed = bool(changed_stores)
+
+        if changed:
+            # Stats for all the updated stores are calculated at once
+            refresh_stores_stats(Store.objects.filter(pk__in=changed_stores))
         # If this TP has no stores, cache should be updated forcibly.
-        if not changed and stores.count() == 0:
+        elif stores.count() == 0:
             self.update_all_cache()
 
         return changed
@@ -364,8 +345,7 @@ class TranslationProject(models.Model, CachedTreeItem):
         return not does_not_exist(self.abs_real_path)
 
     def scan_files(self):
-        """Scans the file system and returns a list of translation files.
-        """
+        """Scans the file system and returns a list of translation files."""
         from pootle_app.project_tree import add_files
 
         all_files = []
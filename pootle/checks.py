@@ -249,6 +249,32 @@ def check_settings(app_configs=None, **kwargs):
                     )
                 )
 
+    from pootle.core.mixins.treeitem import STATS_STORAGES
+
+    if settings.ZING_STATS_STORAGE not in STATS_STORAGES:
+        errors.append(
+            checks.Critical(
+                _("Invalid value for ZING_STATS_STORAGE."),
+                hint=_(
+                    "Set ZING_STATS_STORAGE to one of: %s."
+                    % ", ".join(sorted(STATS_STORAGES))
+                ),
+                id="pootle.C018",
+            )
+        )
+
+    if settings.ZING_STATS_DELTA_UPDATES and settings.ZING_STATS_STORAGE != "hash":
+        errors.append(
+            checks.Critical(
+                _("ZING_STATS_DELTA_UPDATES requires the 'hash' stats storage."),
+                hint=_(
+                    "Set ZING_STATS_STORAGE to 'hash' or disable "
+                    "ZING_STATS_DELTA_UPDATES."
+                ),
+                id="pootle.C019",
+            )
+        )
+
     return errors
 
 
@@ -8,28 +8,89 @@
 
 import logging
 import time
-from functools import lru_cache
+from hashlib import blake2b
+from itertools import islice
+from multiprocessing import Pool
 
+from translate.__version__ import sver as toolkit_version
+from translate.lang import data
+
+from django.conf import settings
+from django.db import connections
 from django.utils import timezone
 from django.utils.functional import cached_property
 
 from pootle.core.mixins.treeitem import CachedMethods
-from pootle_misc.checks import run_given_filters
+from pootle.core.utils.list import chunked
+from pootle.core.utils.multistring import SEPARATOR
+from pootle_misc.checks import CHECKS_VERSION, get_checker, run_given_filters
 from pootle_store.constants import OBSOLETE
-from pootle_store.models import QualityCheck, Store, Unit
+from pootle_store.models import QualityCheck, Store, Unit, update_critical_checks
 from pootle_store.unit import UnitProxy
-from pootle_translationproject.models import TranslationProject
 
 
 logger = logging.getLogger(__name__)
 
 
+#: Number of units whose checks are calculated and written back together
+CHECKS_CHUNK_SIZE = 1000
+
+
+def get_checks_hash(unit):
+    """Returns a hash of the values quality checks results depend on for
+    `unit`: its normalized source and target, its locations, the checker
+    style of its project and the version of the checks.
+
+    :param unit: an instance of `CheckableUnit`.
+    :return: a signed 64-bit integer.
+    """
+    values = [
+        SEPARATOR.join(data.normalized_unicode(s) for s in unit.source.strings),
+        SEPARATOR.join(data.normalized_unicode(s) for s in unit.target.strings),
+        unit.locations,
+        settings.ZING_QUALITY_CHECKER or unit.checkstyle,
+        "%s:%s" % (toolkit_version, CHECKS_VERSION),
+    ]
+    digest = blake2b("\0".join(values).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def get_check_failures(units, check_names=None):
+    """Runs quality checks over `units`.
+
+    :param units: list of `Unit` values dicts, as used by `CheckableUnit`.
+    :param check_names: limit checks to given list of quality check names.
+    :return: a dict of check failures keyed by unit id.
+    """
+    failures = {}
+    for values in units:
+        unit = CheckableUnit(values)
+        checker = get_checker(unit.checkstyle, unit.language_code)
+        failures[unit.id] = UnitQualityCheck(
+            unit, checker, {}, check_names
+        ).check_failures
+    return failures
+
+
+def _init_worker():
+    # connections inherited from the parent process can't be shared: let
+    # every worker open its own
+    connections.close_all()
+
+
+def _run_worker(args):
+    return get_check_failures(*args)
+
+
 class CheckableUnit(UnitProxy):
     """CheckableUnit wraps a `Unit` values dictionary to provide a `Unit` like
     instance that can be used by UnitQualityCheck
 
-    At a minimum the dict should contain source_f, target_f, store__id, and
-    store__translation_project__id
+    At a minimum the dict should contain source_f, target_f, store__id,
+    store__translation_project__id, and the
+    store__translation_project__language__code and
+    store__translation_project__project__checkstyle keys used to look up
+    the unit's checker with `get_checker()`
     """
 
     @property
@@ -44,6 +105,10 @@ class CheckableUnit(UnitProxy):
     def language_code(self):
         return self.store__translation_project__language__code
 
+    @property
+    def checkstyle(self):
+        return self.store__translation_project__project__checkstyle
+
 
 class UnitQualityCheck(object):
     def __init__(
@@ -151,7 +216,13 @@ class UnitQualityCheck(object):
 
 class QualityCheckUpdater(object):
     def __init__(
-        self, check_names=None, translation_project=None, keep_false_positives=True
+        self,
+        check_names=None,
+        translation_project=None,
+        keep_false_positives=True,
+        jobs=1,
+        progress=None,
+        incremental=False,
     ):
         """Refreshes QualityChecks for Units
 
@@ -160,28 +231,20 @@ class QualityCheckUpdater(object):
             restrict the update to.
         :param keep_false_positives: when set to `False`, it will unmute any
             existing false positive checks.
+        :param jobs: number of worker processes calculating checks.
+        :param progress: callable receiving the number of units checked and
+            updated so far, and the elapsed seconds, after every chunk.
+        :param incremental: when set to `True`, units whose checks hash
+            matches the one recorded last time all checks were calculated for
+            them are skipped.
         """
 
         self.check_names = check_names
         self.translation_project = translation_project
         self.keep_false_positives = keep_false_positives
-        self.stores = set()
-        self._store_to_expire = None
-
-    @cached_property
-    def checks(self):
-        """Existing checks in the database for all units
-        """
-        checks = self.checks_qs
-        check_keys = ("id", "name", "unit_id", "category", "false_positive")
-
-        if self.check_names is not None:
-            checks = checks.filter(name__in=self.check_names)
-
-        all_units_checks = {}
-        for check in checks.values(*check_keys):
-            all_units_checks.setdefault(check["unit_id"], {})[check["name"]] = check
-        return all_units_checks
+        self.jobs = jobs
+        self.progress = progress
+        self.incremental = incremental
 
     @cached_property
     def checks_qs(self):
@@ -206,39 +269,6 @@ class QualityCheckUpdater(object):
     def clear_checks(self):
         QualityCheck.delete_unknown_checks()
 
-    @lru_cache(maxsize=None)
-    def get_checker(self, tp_pk):
-        """Return the site QualityChecker or the QualityCheck associated with
-        the a Unit's TP otherwise.
-        """
-        try:
-            return TranslationProject.objects.get(id=tp_pk).checker
-        except TranslationProject.DoesNotExist:
-            # There seems to be a risk of dangling Stores with no TP
-            logger.error("Missing TP (pk '%s'). No checker retrieved.", tp_pk)
-            return None
-
-    def expire_store_cache(self, store_pk=None):
-        """Whenever a store_pk is found it is queued for cache expiry
-
-        if a new store_pk is called the old one has its cache expired,
-        and the new store_pk is saved
-
-        call with None to expire the current Store's cache
-        """
-        if self._store_to_expire is None:
-            # there is no Store set - queue it for expiry
-            self._store_to_expire = store_pk
-            return
-        if store_pk == self._store_to_expire:
-            # its the same Store that we saw last time
-            return
-        # there was a _store_to_expire set and its changed - expire the cache
-        self.update_store_caches([self._store_to_expire])
-
-        # remember the new store_pk
-        self._store_to_expire = store_pk
-
     def update(self):
         """Update/purge all QualityChecks for Units, and expire Store caches.
         """
@@ -270,25 +300,16 @@ class QualityCheckUpdater(object):
             store.mark_dirty(CachedMethods.CHECKS, CachedMethods.MTIME)
             store.update_dirty_cache()
 
-    def update_translated_unit(self, unit, checker=None):
-        """Update checks for a translated Unit
-        """
-        unit = CheckableUnit(unit)
-        checker = UnitQualityCheck(
-            unit,
-            checker,
-            self.checks.get(unit.id, {}),
-            self.check_names,
-            self.keep_false_positives,
-        )
-        if checker.update():
-            self.expire_store_cache(unit.store)
-            self.units.filter(id=unit.id).update(mtime=timezone.now())
-            return True
-        return False
-
     def update_translated(self):
         """Update checks for translated Units
+
+        Units are processed in chunks, in store order. Checks for the units of
+        a chunk are calculated by `self.jobs` worker processes if set, and
+        then written back all at once.
+
+        The checks hash of every unit is recorded whenever all checks are
+        calculated for it, which allows incremental runs to skip it until its
+        hash changes.
         """
         unit_fields = [
             "id",
@@ -296,32 +317,160 @@ class QualityCheckUpdater(object):
             "target_f",
             "locations",
             "store__id",
+            "store__translation_project__id",
             "store__translation_project__language__code",
+            "store__translation_project__project__checkstyle",
+            "checks_hash",
         ]
 
-        tp_key = "store__translation_project__id"
-        if self.translation_project is None:
-            unit_fields.append(tp_key)
-
-        checker = None
-        if self.translation_project is not None:
-            # we only need to get the checker once if TP is set
-            checker = self.get_checker(self.translation_project.id)
-
         translated = self.units.filter(state__gte=OBSOLETE).order_by("store", "index")
+        chunks = (
+            self.prepare_chunk(units)
+            for units in chunked(
+                translated.values(*unit_fields).iterator(), CHECKS_CHUNK_SIZE
+            )
+        )
+
+        start = time.time()
+        checked_count = 0
         updated_count = 0
-        for unit in translated.values(*unit_fields).iterator():
-            if self.translation_project is not None:
-                # if TP is set then manually add TP.id to the Unit value dict
-                unit[tp_key] = self.translation_project.id
-            if checker is None:
-                checker = self.get_checker(unit[tp_key])
-            if checker and self.update_translated_unit(unit, checker=checker):
-                updated_count += 1
-        # clear the cache of the remaining Store
-        self.expire_store_cache()
+        if self.jobs > 1:
+            # workers are forked: make sure they don't inherit open connections
+            connections.close_all()
+            with Pool(self.jobs, _init_worker) as pool:
+                while True:
+                    # keep a bounded number of chunks in flight
+                    batch = list(islice(chunks, self.jobs * 2))
+                    if not batch:
+                        break
+                    args = [(units, self.check_names) for units, __, __ in batch]
+                    results = pool.imap(_run_worker, args)
+                    for (units, hashes, count), failures in zip(batch, results):
+                        checked_count += count
+                        updated_count += self.update_chunk(units, failures, hashes)
+                        self.report_progress(checked_count, updated_count, start)
+        else:
+            for units, hashes, count in chunks:
+                failures = get_check_failures(units, self.check_names)
+                checked_count += count
+                updated_count += self.update_chunk(units, failures, hashes)
+                self.report_progress(checked_count, updated_count, start)
+
         return updated_count
 
+    def report_progress(self, checked, updated, start):
+        if self.progress is not None:
+            self.progress(checked, updated, time.time() - start)
+
+    def prepare_chunk(self, units):
+        """Calculates the checks hashes for a chunk of units, and leaves out
+        the units with unchanged hashes on incremental runs.
+
+        Unmuting false positives requires checking all units, so no units are
+        left out in that case.
+
+        :param units: list of `Unit` values dicts.
+        :return: a tuple of the units to check, a dict of the hashes which
+            changed keyed by unit id, and the number of units in the chunk.
+        """
+        hashes = {}
+        for unit in units:
+            checks_hash = get_checks_hash(CheckableUnit(unit))
+            if checks_hash != unit["checks_hash"]:
+                hashes[unit["id"]] = checks_hash
+
+        count = len(units)
+        if self.incremental and self.keep_false_positives:
+            units = [unit for unit in units if unit["id"] in hashes]
+        return units, hashes, count
+
+    def update_chunk(self, units, failures, hashes=None):
+        """Writes back check results for a chunk of units, creating, deleting
+        and unmuting checks and touching the updated units with one query
+        each, and expires the caches of the affected stores.
+
+        :param units: list of `Unit` values dicts.
+        :param failures: dict of check failures keyed by unit id, as returned
+            by `get_check_failures()`.
+        :param hashes: dict of changed checks hashes keyed by unit id, as
+            returned by `prepare_chunk()`. They are recorded only if all checks
+            were calculated.
+        :return: the number of units whose checks were updated.
+        """
+        if not failures:
+            return 0
+
+        checks = self.checks_qs.filter(unit_id__in=list(failures.keys()))
+        if self.check_names is not None:
+            checks = checks.filter(name__in=self.check_names)
+        existing = {}
+        for check in checks.values("id", "name", "unit_id", "false_positive"):
+            existing.setdefault(check["unit_id"], {})[check["name"]] = check
+
+        to_create = []
+        to_delete = []
+        to_unmute = []
+        updated = []
+        stores = set()
+        for unit in units:
+            if unit["id"] not in failures:
+                continue
+
+            original_checks = existing.get(unit["id"], {})
+            unit_failures = failures[unit["id"]]
+            changed = False
+            for name, failure in unit_failures.items():
+                if name in original_checks:
+                    check = original_checks.pop(name)
+                    # keep false-positive checks if check is active
+                    if check["false_positive"] and not self.keep_false_positives:
+                        to_unmute.append(check["id"])
+                        changed = True
+                    continue
+
+                # the check didnt exist previously - so create it
+                to_create.append(
+                    QualityCheck(
+                        unit_id=unit["id"],
+                        name=name,
+                        message=failure["message"],
+                        category=failure["category"],
+                    )
+                )
+                changed = True
+
+            # delete any remaining checks that were only in the original list
+            if original_checks:
+                to_delete.extend(check["id"] for check in original_checks.values())
+                changed = True
+
+            if changed:
+                updated.append(unit["id"])
+                stores.add(unit["store__id"])
+
+        if to_create:
+            QualityCheck.objects.bulk_create(to_create)
+        if to_delete:
+            QualityCheck.objects.filter(id__in=to_delete).delete()
+        if to_unmute:
+            QualityCheck.objects.filter(id__in=to_unmute).update(false_positive=False)
+        if updated:
+            updated_units = self.units.filter(id__in=updated)
+            update_critical_checks(updated_units)
+            updated_units.update(mtime=timezone.now())
+            self.update_store_caches(stores)
+        if hashes and self.check_names is None:
+            Unit.simple_objects.bulk_update(
+                [
+                    Unit(id=unit_id, checks_hash=checks_hash)
+                    for unit_id, checks_hash in hashes.items()
+                    if unit_id in failures
+                ],
+                ["checks_hash"],
+            )
+
+        return len(updated)
+
     def update_untranslated(self):
         """Delete QualityChecks for untranslated Units
         """
@@ -331,4 +480,7 @@ class QualityCheckUpdater(object):
         )
         deleted = checks_qs.count()
         checks_qs.delete()
+        self.units.exclude(state__gte=OBSOLETE).filter(critical_checks__gt=0).update(
+            critical_checks=0
+        )
         return deleted
@@ -7,7 +7,9 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
+import calendar
 import logging
+from collections import Counter
 from datetime import datetime
 from enum import Enum
 
@@ -16,9 +18,11 @@ from rq import get_current_job
 from rq.job import Job, JobStatus, dumps, loads
 from rq.utils import utcnow
 
+from django.conf import settings
 from django.db import connection
 from django.utils.encoding import iri_to_uri
 
+from django_redis import get_redis_connection
 from django_rq.queues import get_connection, get_queue
 
 from pootle.core.cache import get_cache
@@ -62,6 +66,459 @@ class CachedMethods(Enum):
         return [str(e) for e in cls]
 
 
+def _sum_counts(result, values):
+    return result + sum(values)
+
+
+def _sum_wordcount_stats(result, values):
+    for value in values:
+        result = dictsum(result, value)
+    return result
+
+
+def _sum_checks(result, values):
+    for value in values:
+        result["checks"] = dictsum(result["checks"], value["checks"])
+        result["unit_critical_error_count"] += value["unit_critical_error_count"]
+    return result
+
+
+def _latest_action(result, values):
+    return max([result] + list(values), key=lambda x: x["mtime"] if "mtime" in x else 0)
+
+
+def _max_value(result, values):
+    return max([result] + list(values))
+
+
+#: Functions combining the stats value of a tree item with the values
+#: of its children, keyed by cached method name.
+STATS_AGGREGATORS = {
+    str(CachedMethods.CHECKS): _sum_checks,
+    str(CachedMethods.LAST_ACTION): _latest_action,
+    str(CachedMethods.LAST_UPDATED): _max_value,
+    str(CachedMethods.MTIME): _max_value,
+    str(CachedMethods.SUGGESTIONS): _sum_counts,
+    str(CachedMethods.WORDCOUNT_STATS): _sum_wordcount_stats,
+}
+
+
+def aggregate_stats(name, value, child_values):
+    """Combines the `name` stats `value` of a tree item with the values
+    of its children.
+
+    :param name: cached method name.
+    :param value: the value calculated for the tree item itself.
+    :param child_values: iterable of values cached for the item's children.
+    """
+    return STATS_AGGREGATORS[str(name)](value, child_values)
+
+
+def get_empty_stats():
+    """Returns the stats values of a tree item with no stats of its own."""
+    return {name: getattr(TreeItem, "_%s" % name)() for name in CachedMethods.get_all()}
+
+
+def make_cache_key(path, name):
+    return iri_to_uri("%s:%s" % (path, name))
+
+
+class KeysStatsStorage(object):
+    """Stores every cached stats value of a tree item under its own key."""
+
+    def get_many(self, paths):
+        names = CachedMethods.get_all()
+        keys = [make_cache_key(path, name) for path in paths for name in names]
+        cached = cache.get_many(keys) if keys else {}
+        return [
+            {name: cached.get(make_cache_key(path, name)) for name in names}
+            for path in paths
+        ]
+
+    def set_many(self, paths_values):
+        data = {
+            make_cache_key(path, name): value
+            for path, values in paths_values.items()
+            for name, value in values.items()
+            if value is not None
+        }
+        if data:
+            cache.set_many(data, None)
+
+    def delete(self, path, names):
+        cache.delete_many([make_cache_key(path, name) for name in names])
+
+
+def _datetime_sort_key(value):
+    return calendar.timegm(value.utctimetuple()) * 1000000 + value.microsecond
+
+
+#: Functions returning an integer sort key for cached values which only ever
+#: move forward, keyed by cached method name.
+LATEST_SORT_KEYS = {
+    str(CachedMethods.LAST_ACTION): lambda value: value.get("mtime", 0),
+    str(CachedMethods.LAST_UPDATED): int,
+    str(CachedMethods.MTIME): _datetime_sort_key,
+}
+
+
+class StatsDelta(object):
+    """Pending in-place changes to the cached stats of a tree item.
+
+    `counters` are increments for the total, translated, fuzzy, suggestions
+    and critical counts, `checks` are increments for per check counts and
+    `latest` holds values for cached methods in `LATEST_SORT_KEYS`, which
+    replace the cached ones only if they are newer.
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+        self.checks = Counter()
+        self.latest = {}
+
+    def __bool__(self):
+        return (
+            any(self.counters.values())
+            or any(self.checks.values())
+            or bool(self.latest)
+        )
+
+    def add(self, counters=None, checks=None, latest=None):
+        self.counters.update(counters or {})
+        self.checks.update(checks or {})
+        for name, value in (latest or {}).items():
+            sort_key = LATEST_SORT_KEYS[name]
+            if name not in self.latest or sort_key(value) > sort_key(self.latest[name]):
+                self.latest[name] = value
+
+
+#: Applies a `StatsDelta` to the hashes of a single tree item. Counters are
+#: only incremented if they are already cached, so a missing value is
+#: never replaced by a partial one.
+APPLY_DELTA_SCRIPT = """
+local i = 1
+local has_checks = redis.call('HEXISTS', KEYS[1], 'critical') == 1
+
+for _ = 1, tonumber(ARGV[i]) do
+    if redis.call('HEXISTS', KEYS[1], ARGV[i + 1]) == 1 then
+        redis.call('HINCRBY', KEYS[1], ARGV[i + 1], ARGV[i + 2])
+    end
+    i = i + 2
+end
+i = i + 1
+
+for _ = 1, tonumber(ARGV[i]) do
+    if has_checks then
+        redis.call('HINCRBY', KEYS[2], ARGV[i + 1], ARGV[i + 2])
+    end
+    i = i + 2
+end
+i = i + 1
+
+for _ = 1, tonumber(ARGV[i]) do
+    local sort_field = ARGV[i + 1] .. ':key'
+    local current = redis.call('HGET', KEYS[1], sort_field)
+    if current and tonumber(current) < tonumber(ARGV[i + 3]) then
+        redis.call('HSET', KEYS[1], ARGV[i + 1], ARGV[i + 2],
+                   sort_field, ARGV[i + 3])
+    end
+    i = i + 3
+end
+"""
+
+
+class HashStatsStorage(object):
+    """Stores all cached stats values of a tree item in a single Redis hash.
+
+    Counters (wordcounts, suggestions and critical errors) are kept as
+    integer fields so they can be updated in place by `apply_delta()`, and
+    per check counts go to a separate hash. Any other value is stored
+    encoded, along with an integer sort key telling which value is newer.
+    """
+
+    key_prefix = "pootle:stats:"
+    checks_key_prefix = "pootle:stats:checks:"
+
+    wordcount_fields = ("total", "translated", "fuzzy")
+    suggestions_field = "suggestions"
+    critical_field = "critical"
+
+    def make_key(self, path):
+        return iri_to_uri(self.key_prefix + path)
+
+    def make_checks_key(self, path):
+        return iri_to_uri(self.checks_key_prefix + path)
+
+    def get_fields(self, names):
+        fields = []
+        for name in names:
+            if name == str(CachedMethods.WORDCOUNT_STATS):
+                fields.extend(self.wordcount_fields)
+            elif name == str(CachedMethods.SUGGESTIONS):
+                fields.append(self.suggestions_field)
+            elif name == str(CachedMethods.CHECKS):
+                fields.append(self.critical_field)
+            else:
+                fields.extend([name, "%s:key" % name])
+        return fields
+
+    def encode(self, values):
+        """Returns the hash fields for `values`, and the per check counts
+        if these are part of `values` (`None` otherwise).
+        """
+        fields = {}
+        checks = None
+        for name, value in values.items():
+            if value is None:
+                continue
+
+            if name == str(CachedMethods.WORDCOUNT_STATS):
+                fields.update({field: value[field] for field in self.wordcount_fields})
+            elif name == str(CachedMethods.SUGGESTIONS):
+                fields[self.suggestions_field] = value
+            elif name == str(CachedMethods.CHECKS):
+                fields[self.critical_field] = value.get("unit_critical_error_count", 0)
+                checks = value.get("checks", {})
+            else:
+                fields[name] = cache.client.encode(value)
+                fields["%s:key" % name] = LATEST_SORT_KEYS[name](value)
+
+        return fields, checks
+
+    def decode(self, fields, checks):
+        fields = {field.decode("utf-8"): value for field, value in fields.items()}
+        values = {name: None for name in CachedMethods.get_all()}
+
+        if all(field in fields for field in self.wordcount_fields):
+            values[str(CachedMethods.WORDCOUNT_STATS)] = {
+                field: int(fields[field]) for field in self.wordcount_fields
+            }
+        if self.suggestions_field in fields:
+            values[str(CachedMethods.SUGGESTIONS)] = int(fields[self.suggestions_field])
+        if self.critical_field in fields:
+            values[str(CachedMethods.CHECKS)] = {
+                "unit_critical_error_count": int(fields[self.critical_field]),
+                "checks": {
+                    name.decode("utf-8"): int(count)
+                    for name, count in checks.items()
+                    if int(count) > 0
+                },
+            }
+        for name in LATEST_SORT_KEYS:
+            if name in fields:
+                values[name] = cache.client.decode(fields[name])
+
+        return values
+
+    def get_many(self, paths):
+        if not paths:
+            return []
+
+        with get_redis_connection("stats").pipeline(transaction=False) as pipe:
+            for path in paths:
+                pipe.hgetall(self.make_key(path))
+                pipe.hgetall(self.make_checks_key(path))
+            hashes = pipe.execute()
+
+        return [
+            self.decode(fields, checks)
+            for fields, checks in zip(hashes[::2], hashes[1::2])
+        ]
+
+    def set_many(self, paths_values):
+        # a transaction keeps readers from seeing partially replaced checks
+        with get_redis_connection("stats").pipeline() as pipe:
+            for path, values in paths_values.items():
+                fields, checks = self.encode(values)
+                if checks is not None:
+                    pipe.delete(self.make_checks_key(path))
+                    if checks:
+                        pipe.hset(self.make_checks_key(path), mapping=checks)
+                if fields:
+                    pipe.hset(self.make_key(path), mapping=fields)
+            pipe.execute()
+
+    def delete(self, path, names):
+        if not names:
+            return
+
+        with get_redis_connection("stats").pipeline() as pipe:
+            pipe.hdel(self.make_key(path), *self.get_fields(names))
+            if str(CachedMethods.CHECKS) in names:
+                pipe.delete(self.make_checks_key(path))
+            pipe.execute()
+
+    def apply_delta(self, paths, delta):
+        """Applies `delta` in place to the cached stats of all `paths`.
+
+        Values which aren't cached are left alone.
+
+        :param paths: list of tree item cache keys (`pootle_path`s).
+        :param delta: a `StatsDelta` instance.
+        """
+        counters = [(name, value) for name, value in delta.counters.items() if value]
+        checks = [(name, value) for name, value in delta.checks.items() if value]
+        args = [len(counters)]
+        for name, value in counters:
+            args.extend([name, value])
+        args.append(len(checks))
+        for name, value in checks:
+            args.extend([name, value])
+        args.append(len(delta.latest))
+        for name, value in delta.latest.items():
+            args.extend(
+                [name, cache.client.encode(value), LATEST_SORT_KEYS[name](value)]
+            )
+
+        r_con = get_redis_connection("stats")
+        script = r_con.register_script(APPLY_DELTA_SCRIPT)
+        with r_con.pipeline(transaction=False) as pipe:
+            for path in paths:
+                script(
+                    keys=[self.make_key(path), self.make_checks_key(path)],
+                    args=args,
+                    client=pipe,
+                )
+            pipe.execute()
+
+
+STATS_STORAGES = {
+    "keys": KeysStatsStorage,
+    "hash": HashStatsStorage,
+}
+
+
+def get_stats_storage(layout=None):
+    """Returns the stats storage for `layout`, defaulting to the one set
+    in `ZING_STATS_STORAGE`.
+    """
+    return STATS_STORAGES[layout or settings.ZING_STATS_STORAGE]()
+
+
+def get_many_cached_stats(paths):
+    """Retrieves all cached stats values for `paths` in a single round-trip.
+
+    :param paths: list of tree item cache keys (`pootle_path`s).
+    :return: a list of `{name: value}` dicts in the same order as `paths`.
+        Missing values are `None`.
+    """
+    values = get_stats_storage().get_many(paths)
+    if settings.ZING_STATS_PERSISTENT:
+        restore_missing_stats(paths, values)
+    return values
+
+
+def set_many_cached_stats(paths_values):
+    """Writes cached stats values for several paths in a single round-trip.
+
+    :param paths_values: a dict of `{path: {name: value}}`. `None` values
+        are skipped.
+    """
+    get_stats_storage().set_many(paths_values)
+    if settings.ZING_STATS_PERSISTENT:
+        from pootle_statistics.models import TreeItemStats
+
+        TreeItemStats.objects.set_many(paths_values)
+
+
+def delete_cached_stats(path, names):
+    """Removes cached stats values `names` for `path`."""
+    get_stats_storage().delete(path, names)
+    if settings.ZING_STATS_PERSISTENT:
+        from pootle_statistics.models import TreeItemStats
+
+        TreeItemStats.objects.delete_values(path, names)
+
+
+def restore_missing_stats(paths, values):
+    """Fills in values missing from the stats cache with persisted stats,
+    writing them back to the cache.
+
+    :param paths: list of tree item cache keys (`pootle_path`s).
+    :param values: a list of `{name: value}` dicts in the same order as
+        `paths`, as retrieved from the cache. It's updated in place.
+    """
+    from pootle_statistics.models import TreeItemStats
+
+    missing = [
+        path for path, path_values in zip(paths, values) if None in path_values.values()
+    ]
+    if not missing:
+        return
+
+    persisted = TreeItemStats.objects.get_many(missing)
+    restored = {}
+    for path, path_values in zip(paths, values):
+        for name, value in persisted.get(path, {}).items():
+            if path_values[name] is None and value is not None:
+                path_values[name] = value
+                restored.setdefault(path, {})[name] = value
+
+    if restored:
+        logger.debug("Restored persisted stats for %s", ", ".join(restored))
+        get_stats_storage().set_many(restored)
+
+
+def get_many_dirty_scores(paths):
+    """Retrieves the dirty scores for `paths` within a single pipeline.
+
+    :param paths: list of tree item cache keys (`pootle_path`s).
+    :return: a list of scores in the same order as `paths`.
+    """
+    if not paths:
+        return []
+
+    r_con = get_connection()
+    with r_con.pipeline(transaction=False) as pipe:
+        for path in paths:
+            pipe.zscore(KEY_DIRTY_TREEITEMS, path)
+        return [score or 0 for score in pipe.execute()]
+
+
+def format_stats(values, is_dirty):
+    """Shapes cached stats `values` as returned by `TreeItem.get_stats()`."""
+    result = {
+        "total": None,
+        "translated": None,
+        "fuzzy": None,
+        "suggestions": None,
+        "lastaction": None,
+        "critical": None,
+        "lastupdated": None,
+        "is_dirty": is_dirty,
+    }
+
+    if values[str(CachedMethods.WORDCOUNT_STATS)] is not None:
+        result.update(values[str(CachedMethods.WORDCOUNT_STATS)])
+    result["suggestions"] = values[str(CachedMethods.SUGGESTIONS)]
+    result["lastaction"] = values[str(CachedMethods.LAST_ACTION)]
+    if values[str(CachedMethods.CHECKS)] is not None:
+        result["critical"] = values[str(CachedMethods.CHECKS)].get(
+            "unit_critical_error_count", 0
+        )
+    result["lastupdated"] = values[str(CachedMethods.LAST_UPDATED)]
+
+    return result
+
+
+def get_many_stats(items):
+    """Retrieves the stats for several cached tree items at once.
+
+    Stats values and dirty scores are fetched in two round-trips regardless
+    of the number of items.
+
+    :param items: list of `CachedTreeItem` instances.
+    :return: a list of stats dicts in the same order as `items`.
+    """
+    paths = [item.cache_key for item in items]
+    return [
+        format_stats(values, score > 0)
+        for values, score in zip(
+            get_many_cached_stats(paths), get_many_dirty_scores(paths)
+        )
+    ]
+
+
 class TreeItem(object):
     def __init__(self, *args, **kwargs):
         self._children = None
@@ -131,52 +588,55 @@ class TreeItem(object):
 
     def _calc_suggestion_count(self):
         self.initialize_children()
-        return self._get_suggestion_count() + sum(
-            [item.get_cached(CachedMethods.SUGGESTIONS) for item in self.children]
+        return aggregate_stats(
+            CachedMethods.SUGGESTIONS,
+            self._get_suggestion_count(),
+            [item.get_cached(CachedMethods.SUGGESTIONS) for item in self.children],
         )
 
     def _calc_wordcount_stats(self):
         result = self._get_wordcount_stats()
         self.initialize_children()
-        for item in self.children:
-            result = dictsum(result, item.get_cached(CachedMethods.WORDCOUNT_STATS))
-
-        return result
+        return aggregate_stats(
+            CachedMethods.WORDCOUNT_STATS,
+            result,
+            [item.get_cached(CachedMethods.WORDCOUNT_STATS) for item in self.children],
+        )
 
     def _calc_last_action(self):
         self.initialize_children()
-
-        return max(
-            [self._get_last_action()]
-            + [item.get_cached(CachedMethods.LAST_ACTION) for item in self.children],
-            key=lambda x: x["mtime"] if "mtime" in x else 0,
+        return aggregate_stats(
+            CachedMethods.LAST_ACTION,
+            self._get_last_action(),
+            [item.get_cached(CachedMethods.LAST_ACTION) for item in self.children],
         )
 
     def _calc_mtime(self):
         """get latest modification time"""
         self.initialize_children()
-        return max(
-            [self._get_mtime()]
-            + [item.get_cached(CachedMethods.MTIME) for item in self.children]
+        return aggregate_stats(
+            CachedMethods.MTIME,
+            self._get_mtime(),
+            [item.get_cached(CachedMethods.MTIME) for item in self.children],
         )
 
     def _calc_last_updated(self):
         """get last updated"""
         self.initialize_children()
-        return max(
-            [self._get_last_updated()]
-            + [item.get_cached(CachedMethods.LAST_UPDATED) for item in self.children],
+        return aggregate_stats(
+            CachedMethods.LAST_UPDATED,
+            self._get_last_updated(),
+            [item.get_cached(CachedMethods.LAST_UPDATED) for item in self.children],
         )
 
     def _calc_checks(self):
         result = self._get_checks()
         self.initialize_children()
-        for item in self.children:
-            item_res = item.get_cached(CachedMethods.CHECKS)
-            result["checks"] = dictsum(result["checks"], item_res["checks"])
-            result["unit_critical_error_count"] += item_res["unit_critical_error_count"]
-
-        return result
+        return aggregate_stats(
+            CachedMethods.CHECKS,
+            result,
+            [item.get_cached(CachedMethods.CHECKS) for item in self.children],
+        )
 
     def get_stats(self, include_children=True):
         """Get stats for this particular tree item.
@@ -188,46 +648,28 @@ class TreeItem(object):
         :param include_children: whether stats for children items should be
             included or not.
         """
-        self.initialize_children()
-        result = {
-            "total": None,
-            "translated": None,
-            "fuzzy": None,
-            "suggestions": None,
-            "lastaction": None,
-            "critical": None,
-            "lastupdated": None,
-            "is_dirty": self.is_dirty(),
-        }
-
-        try:
-            result.update(self._calc_wordcount_stats())
-        except NoCachedStats:
-            pass
-
-        try:
-            result["suggestions"] = self._calc_suggestion_count()
-        except NoCachedStats:
-            pass
+        children = list(self.children)
+        paths = [item.cache_key for item in children]
+        children_values = get_many_cached_stats(paths)
+        children_scores = get_many_dirty_scores(paths)
+
+        values = {}
+        for name in CachedMethods.get_all():
+            child_values = [item_values[name] for item_values in children_values]
+            if None in child_values:
+                values[name] = None
+                continue
 
-        try:
-            result["lastaction"] = self._calc_last_action()
-        except NoCachedStats:
-            pass
+            values[name] = aggregate_stats(
+                name, getattr(self, "_%s" % name)(), child_values
+            )
 
-        try:
-            result["critical"] = self.get_error_unit_count()
-        except NoCachedStats:
-            pass
-
-        try:
-            result["lastupdated"] = self._calc_last_updated()
-        except NoCachedStats:
-            pass
+        result = format_stats(values, any(score > 0 for score in children_scores))
 
         if include_children:
             result["children"] = [
-                item.get_stats(include_children=False) for item in self.children
+                format_stats(item_values, score > 0)
+                for item_values, score in zip(children_values, children_scores)
             ]
 
         return result
@@ -249,20 +691,34 @@ class TreeItem(object):
 class CachedTreeItem(TreeItem):
     def __init__(self, *args, **kwargs):
         self._dirty_cache = set()
+        self._stats_delta = StatsDelta()
         super().__init__()
 
     def make_cache_key(self, name):
-        return iri_to_uri("%s:%s" % (self.cache_key, name))
+        return make_cache_key(self.cache_key, name)
 
     def can_be_updated(self):
         """This method will be overridden in descendants"""
         return True
 
     def set_cached_value(self, name, value):
-        return cache.set(self.make_cache_key(name), value, None)
+        if value is None:
+            delete_cached_stats(self.cache_key, [str(name)])
+        else:
+            set_many_cached_stats({self.cache_key: {str(name): value}})
 
     def get_cached_value(self, name):
-        return cache.get(self.make_cache_key(name))
+        return get_many_cached_stats([self.cache_key])[0][str(name)]
+
+    @staticmethod
+    def set_many_cached_values(items_values):
+        """Sets cached stats for several tree items at once.
+
+        :param items_values: a dict of `{tree_item: {name: value}}`.
+        """
+        set_many_cached_stats(
+            {item.cache_key: values for item, values in items_values.items()}
+        )
 
     def get_last_job_key(self):
         key = self.cache_key
@@ -315,51 +771,20 @@ class CachedTreeItem(TreeItem):
     def get_stats(self, include_children=True):
         """Get stats for this particular tree item.
 
+        Cached values for the item and its children are retrieved in bulk.
+
         :param include_children: whether stats for children items should be
             included or not.
         """
+        items = [self]
         if include_children:
-            self.initialize_children()
-        result = {
-            "total": None,
-            "translated": None,
-            "fuzzy": None,
-            "suggestions": None,
-            "lastaction": None,
-            "critical": None,
-            "lastupdated": None,
-            "is_dirty": self.is_dirty(),
-        }
-
-        try:
-            result.update(self.get_cached(CachedMethods.WORDCOUNT_STATS))
-        except NoCachedStats:
-            pass
-
-        try:
-            result["suggestions"] = self.get_cached(CachedMethods.SUGGESTIONS)
-        except NoCachedStats:
-            pass
+            items.extend(self.children)
 
-        try:
-            result["lastaction"] = self.get_cached(CachedMethods.LAST_ACTION)
-        except NoCachedStats:
-            pass
-
-        try:
-            result["critical"] = self.get_error_unit_count()
-        except NoCachedStats:
-            pass
-
-        try:
-            result["lastupdated"] = self.get_cached(CachedMethods.LAST_UPDATED)
-        except NoCachedStats:
-            pass
+        stats = get_many_stats(items)
+        result = stats[0]
 
         if include_children:
-            result["children"] = [
-                item.get_stats(include_children=False) for item in self.children
-            ]
+            result["children"] = stats[1:]
 
         return result
 
@@ -376,6 +801,18 @@ class CachedTreeItem(TreeItem):
         for key in args:
             self._dirty_cache.add(str(key))
 
+    def unmark_dirty(self, *args):
+        """Unmark cached method names for this TreeItem as dirty"""
+        for key in args:
+            self._dirty_cache.discard(str(key))
+
+    def add_stats_delta(self, counters=None, checks=None, latest=None):
+        """Record changes to be applied in place to the cached stats of this
+        TreeItem and all its parents on the next `update_dirty_cache()` call
+        (see `StatsDelta`)
+        """
+        self._stats_delta.add(counters=counters, checks=checks, latest=latest)
+
     def mark_all_dirty(self):
         """Mark all cached method names for this TreeItem as dirty"""
         self._dirty_cache = set(CachedMethods.get_all())
@@ -384,8 +821,7 @@ class CachedTreeItem(TreeItem):
         self.mark_all_dirty()
 
         keys = self._dirty_cache
-        for key in keys:
-            cache.delete(self.make_cache_key(key))
+        delete_cached_stats(self.cache_key, list(keys))
 
         if keys:
             logger.debug("%s deleted from %s cache", keys, self.cache_key)
@@ -446,14 +882,50 @@ class CachedTreeItem(TreeItem):
 
     def update_dirty_cache(self):
         """Add a RQ job which updates dirty cached stats of current TreeItem
-        to the default queue
+        to the default queue (or schedule a batched stats update if
+        `ZING_STATS_BATCH_UPDATES` is set). Pending stats deltas are
+        applied right away once the transaction is committed.
         """
+        if self._stats_delta:
+            self.apply_stats_delta()
+
         _dirty = self._dirty_cache.copy()
         if _dirty:
             self._dirty_cache = set()
+            if settings.ZING_STATS_BATCH_UPDATES:
+                from pootle.core.stats import schedule_stats_update
+
+                schedule_stats_update(self)
+                return
+
             self.register_all_dirty()
             create_update_cache_job_wrapper(self, _dirty)
 
+    def apply_stats_delta(self):
+        """Apply pending stats deltas to the cached stats of current TreeItem
+        and all its parents
+        """
+        delta = self._stats_delta
+        self._stats_delta = StatsDelta()
+        paths = self.all_pootle_paths()
+
+        def _apply_stats_delta():
+            storage = get_stats_storage()
+            storage.apply_delta(paths, delta)
+            if settings.ZING_STATS_PERSISTENT:
+                from pootle_statistics.models import TreeItemStats
+
+                TreeItemStats.objects.set_many(
+                    dict(zip(paths, storage.get_many(paths)))
+                )
+
+        # keep deltas in the same order as recalculations, which only
+        # happen once the transaction is committed for asynchronous queues
+        if get_queue("default")._is_async:
+            connection.on_commit(_apply_stats_delta)
+        else:
+            _apply_stats_delta()
+
     def update_all_cache(self):
         """Add a RQ job which updates all cached stats of current TreeItem
         to the default queue
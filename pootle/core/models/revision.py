@@ -7,6 +7,7 @@
 # AUTHORS file for copyright and authorship information.
 
 from ..cache import get_cache
+from ..url_helpers import split_pootle_path
 
 
 cache = get_cache("redis")
@@ -20,6 +21,7 @@ class Revision(object):
     """Wrapper around the revision counter stored in Redis."""
 
     CACHE_KEY = "pootle:revision"
+    PATH_CACHE_KEY = "pootle:revision:path:%s"
     INITIAL = 0
 
     @classmethod
@@ -73,3 +75,27 @@ class Revision(object):
             return cache.incr(cls.CACHE_KEY)
         except ValueError:
             raise NoRevision()
+
+    @classmethod
+    def get_for_path(cls, pootle_path):
+        """Gets the revision units within `pootle_path` were last changed
+        at. This is only tracked for translation projects, languages and
+        projects.
+
+        :return: The revision number, or `None` if it's unknown.
+        """
+        return cache.get(cls.PATH_CACHE_KEY % pootle_path)
+
+    @classmethod
+    def set_for_store(cls, pootle_path, value):
+        """Sets `value` as the revision units within the translation
+        project, language and project of the store at `pootle_path` were last
+        changed at.
+        """
+        language_code, project_code = split_pootle_path(pootle_path)[:2]
+        paths = (
+            "/%s/%s/" % (language_code, project_code),
+            "/%s/" % language_code,
+            "/projects/%s/" % project_code,
+        )
+        cache.set_many({cls.PATH_CACHE_KEY % path: value for path in paths})
@@ -6,9 +6,9 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
-from .backends import ElasticSearchBackend
+from .backends import ElasticSearchBackend, LocalTMBackend
 from .base import SearchBackend
 from .broker import SearchBroker
 
 
-__all__ = ("SearchBackend", "SearchBroker", "ElasticSearchBackend")
+__all__ = ("SearchBackend", "SearchBroker", "ElasticSearchBackend", "LocalTMBackend")
@@ -9,14 +9,14 @@
 
 import logging
 
-import Levenshtein
-
 try:
-    from elasticsearch import Elasticsearch
+    from elasticsearch import Elasticsearch, helpers
     from elasticsearch.exceptions import ElasticsearchException
 except ImportError:
     Elasticsearch = None
 
+from pootle.core.utils.similarity import get_similarities
+
 from ..base import SearchBackend
 
 
@@ -29,6 +29,9 @@ logger = logging.getLogger(__name__)
 DEFAULT_MIN_SIMILARITY = 0.7
 INDEX_PREFIX = "zing_tm_"
 
+#: Maximum number of documents indexed by a single bulk request
+BULK_CHUNK_SIZE = 2000
+
 
 def filter_hits_by_distance(hits, source_text, min_similarity=DEFAULT_MIN_SIMILARITY):
     """Returns ES `hits` filtered according to their Levenshtein distance
@@ -41,32 +44,74 @@ def filter_hits_by_distance(hits, source_text, min_similarity=DEFAULT_MIN_SIMILA
     if min_similarity <= 0 or min_similarity >= 1:
         min_similarity = DEFAULT_MIN_SIMILARITY
 
-    filtered_hits = []
-    for hit in hits:
-        hit_source_text = hit["_source"]["source"]
-        distance = Levenshtein.distance(source_text, hit_source_text)
-        similarity = 1 - distance / float(max(len(source_text), len(hit_source_text)))
-
-        logger.debug(
-            "Similarity: %.2f (distance: %d)\nOriginal:\t%s\nComparing with:\t%s",
-            similarity,
-            distance,
-            source_text,
-            hit_source_text,
-        )
+    similarities = get_similarities(
+        source_text,
+        [hit["_source"]["source"] for hit in hits],
+        min_similarity=min_similarity,
+    )
 
-        if similarity < min_similarity:
+    filtered_hits = []
+    for hit, similarity in zip(hits, similarities):
+        if similarity is None:
             break
 
         filtered_hits.append(hit)
 
+    logger.debug(
+        "%d out of %d hits are similar to: %s",
+        len(filtered_hits),
+        len(hits),
+        source_text,
+    )
+
     return filtered_hits
 
 
+def get_tm_results(unit, hits):
+    """Returns TM results for `unit` out of ES-like `hits`, leaving out the
+    unit itself and merging hits with the same source and target.
+    """
+    counter = {}
+    res = []
+    for hit in hits:
+        if str(unit.id) == str(hit["_id"]):
+            continue
+
+        body = hit["_source"]
+        translation_pair = body["source"] + body["target"]
+        if translation_pair not in counter:
+            counter[translation_pair] = 1
+            res.append(
+                {
+                    "unit_id": hit["_id"],
+                    "source": body["source"],
+                    "target": body["target"],
+                    "project": body["project"],
+                    "path": body["path"],
+                    "username": body["username"],
+                    "fullname": body["fullname"],
+                    "email_md5": body["email_md5"],
+                    "mtime": body.get("mtime", None),
+                    "score": hit["_score"],
+                }
+            )
+        else:
+            counter[translation_pair] += 1
+
+    for item in res:
+        item["count"] = counter[item["source"] + item["target"]]
+
+    return res
+
+
 class ElasticSearchBackend(SearchBackend):
-    def __init__(self):
-        super().__init__()
+    required_settings = ("HOST", "PORT")
+
+    def __init__(self, tm_settings=None):
+        super().__init__(tm_settings)
         self._es = self._get_es_server()
+        # names of the indices known to exist
+        self._indices = set()
 
     def _get_es_server(self):
         return Elasticsearch(
@@ -74,15 +119,16 @@ class ElasticSearchBackend(SearchBackend):
         )
 
     def _create_index_if_missing(self, name):
+        if name in self._indices:
+            return
+
         try:
             if not self._es.indices.exists(name):
                 self._es.indices.create(name)
+            self._indices.add(name)
         except ElasticsearchException as e:
             self._log_error(e)
 
-    def _is_valuable_hit(self, unit, hit):
-        return str(unit.id) != hit["_id"]
-
     def _es_call(self, cmd, *args, **kwargs):
         try:
             return getattr(self._es, cmd)(*args, **kwargs)
@@ -99,8 +145,6 @@ class ElasticSearchBackend(SearchBackend):
         )
 
     def search(self, unit):
-        counter = {}
-        res = []
         language = unit.store.translation_project.language.code
         index_name = INDEX_PREFIX + language.lower()
         es_res = self._es_call(
@@ -111,6 +155,7 @@ class ElasticSearchBackend(SearchBackend):
                     "match": {"source": {"query": unit.source, "fuzziness": "AUTO"}}
                 }
             },
+            request_timeout=self._timeout,
         )
 
         if es_res is None:
@@ -132,35 +177,20 @@ class ElasticSearchBackend(SearchBackend):
             unit.source,
             min_similarity=self._settings.get("MIN_SIMILARITY", DEFAULT_MIN_SIMILARITY),
         )
-        for hit in hits:
-            if self._is_valuable_hit(unit, hit):
-                body = hit["_source"]
-                translation_pair = body["source"] + body["target"]
-                if translation_pair not in counter:
-                    counter[translation_pair] = 1
-                    res.append(
-                        {
-                            "unit_id": hit["_id"],
-                            "source": body["source"],
-                            "target": body["target"],
-                            "project": body["project"],
-                            "path": body["path"],
-                            "username": body["username"],
-                            "fullname": body["fullname"],
-                            "email_md5": body["email_md5"],
-                            "mtime": body.get("mtime", None),
-                            "score": hit["_score"],
-                        }
-                    )
-                else:
-                    counter[translation_pair] += 1
-
-        for item in res:
-            item["count"] = counter[item["source"] + item["target"]]
-
-        return res
+        return get_tm_results(unit, hits)
 
     def update(self, language, obj):
         index_name = INDEX_PREFIX + language.lower()
         self._create_index_if_missing(index_name)
         self._es_call("index", index=index_name, body=obj, id=obj["id"])
+
+    def update_many(self, language, objs):
+        index_name = INDEX_PREFIX + language.lower()
+        self._create_index_if_missing(index_name)
+        actions = (
+            {"_index": index_name, "_id": obj["id"], "_source": obj} for obj in objs
+        )
+        try:
+            helpers.bulk(self._es, actions, chunk_size=BULK_CHUNK_SIZE)
+        except ElasticsearchException as e:
+            self._log_error(e)
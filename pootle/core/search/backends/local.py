@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from pootle.core.utils.similarity import get_similarities
+
+from ..base import SearchBackend
+from .elasticsearch import DEFAULT_MIN_SIMILARITY, get_tm_results
+
+
+__all__ = ("LocalTMBackend",)
+
+
+logger = logging.getLogger(__name__)
+
+
+#: Maximum number of trigrams of the source text to look up, the least
+#: frequent ones are used
+MAX_QUERY_NGRAMS = 8
+#: Number of best-ranked candidates compared to the source text
+MAX_CANDIDATES = 50
+#: Number of seconds trigram frequencies are cached for
+FREQUENCIES_MAX_AGE = 3600
+#: Seconds to wait for locks held by other connections, out of searches
+BUSY_TIMEOUT = 5
+#: Number of SQLite VM instructions between checks of the search deadline
+PROGRESS_STEPS = 1000
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS units (
+        id INTEGER PRIMARY KEY,
+        revision INTEGER NOT NULL,
+        source TEXT NOT NULL,
+        length INTEGER NOT NULL,
+        data TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS units_revision ON units (revision)",
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS units_fts USING fts5(
+        source, content='units', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS units_vocab USING fts5vocab(units_fts, 'row')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS units_ai AFTER INSERT ON units BEGIN
+        INSERT INTO units_fts (rowid, source) VALUES (new.id, new.source);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS units_au AFTER UPDATE ON units BEGIN
+        INSERT INTO units_fts (units_fts, rowid, source)
+            VALUES ('delete', old.id, old.source);
+        INSERT INTO units_fts (rowid, source) VALUES (new.id, new.source);
+    END
+    """,
+)
+
+SEARCH_QUERY = """
+    SELECT units.id, units.data
+    FROM units_fts JOIN units ON units.id = units_fts.rowid
+    WHERE units_fts MATCH ? AND units.length BETWEEN ? AND ?
+    ORDER BY units_fts.rank
+    LIMIT ?
+"""
+
+UPDATE_QUERY = """
+    INSERT INTO units (id, revision, source, length, data) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        revision = excluded.revision,
+        source = excluded.source,
+        length = excluded.length,
+        data = excluded.data
+"""
+
+
+def get_ngrams(text):
+    """Returns the distinct trigrams of `text`, as indexed by FTS."""
+    text = text.lower()
+    ngrams = []
+    for i in range(len(text) - 2):
+        ngram = text[i : i + 3]
+        if ngram.strip() and ngram not in ngrams:
+            ngrams.append(ngram)
+    return ngrams
+
+
+def get_ngrams_query(ngrams, frequencies):
+    """Returns an FTS query matching any of the least frequent `ngrams`.
+
+    :param frequencies: dict of the number of units containing each trigram.
+        Trigrams missing from it are considered the least frequent.
+    """
+    ngrams = sorted(ngrams, key=lambda ngram: frequencies.get(ngram, 0))
+    return " OR ".join(
+        '"%s"' % ngram.replace('"', '""') for ngram in ngrams[:MAX_QUERY_NGRAMS]
+    )
+
+
+class LocalTMBackend(SearchBackend):
+    """Translation memory stored in local SQLite databases, one per language,
+    where sources are looked up through a full-text trigram index.
+
+    Databases are kept in the directory set by the `PATH` setting.
+    """
+
+    required_settings = ("PATH",)
+
+    def __init__(self, tm_settings=None):
+        super().__init__(tm_settings)
+        self._path = self._settings["PATH"]
+        self._local = threading.local()
+
+    def _get_local(self):
+        """Returns the per-thread connections and trigram frequencies."""
+        local = self._local
+        if not hasattr(local, "dbs"):
+            local.dbs = {}
+            local.frequencies = {}
+        return local
+
+    def _get_db(self, language):
+        """Returns the connection to the database for `language`, which is
+        created if missing. Connections are kept per thread.
+        """
+        language = language.lower()
+        dbs = self._get_local().dbs
+        if language not in dbs:
+            os.makedirs(self._path, exist_ok=True)
+            db = sqlite3.connect(
+                os.path.join(self._path, "%s.db" % language), timeout=BUSY_TIMEOUT
+            )
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            with db:
+                for statement in SCHEMA:
+                    db.execute(statement)
+            dbs[language] = db
+
+        return dbs[language]
+
+    def _get_frequencies(self, language):
+        """Returns the number of units containing each indexed trigram for
+        `language`. Frequencies are cached per thread for a while, as they're
+        only used to pick the trigrams to look up.
+        """
+        language = language.lower()
+        cache = self._get_local().frequencies
+
+        if (
+            language not in cache
+            or time.time() - cache[language][0] > FREQUENCIES_MAX_AGE
+        ):
+            try:
+                frequencies = dict(
+                    self._get_db(language).execute("SELECT term, doc FROM units_vocab")
+                )
+            except sqlite3.Error as e:
+                logger.error("Local TM error for language %s: %s", language, e)
+                frequencies = {}
+            cache[language] = (time.time(), frequencies)
+
+        return cache[language][1]
+
+    @contextmanager
+    def _deadline(self, db):
+        """Interrupts queries run on `db` within the block once they take
+        longer than the `TIMEOUT` setting, including the time spent waiting
+        for locks held by writers.
+        """
+        deadline = time.monotonic() + self._timeout
+        db.execute("PRAGMA busy_timeout = %d" % (self._timeout * 1000))
+        db.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+        try:
+            yield
+        finally:
+            db.set_progress_handler(None, PROGRESS_STEPS)
+            db.execute("PRAGMA busy_timeout = %d" % (BUSY_TIMEOUT * 1000))
+
+    def get_languages(self):
+        """Returns the codes of the languages with a TM database."""
+        if not os.path.isdir(self._path):
+            return []
+
+        return sorted(
+            filename[:-3]
+            for filename in os.listdir(self._path)
+            if filename.endswith(".db")
+        )
+
+    def get_max_revision(self):
+        """Returns the highest revision of the units in the TM, or -1."""
+        revisions = [
+            self._get_db(language)
+            .execute("SELECT MAX(revision) FROM units")
+            .fetchone()[0]
+            for language in self.get_languages()
+        ]
+        return max([revision for revision in revisions if revision is not None] or [-1])
+
+    def clear(self):
+        """Empties all the TM databases.
+
+        Databases are emptied rather than removed, as other processes may
+        keep connections to them open. Only unreadable databases are removed.
+        """
+        local = self._get_local()
+        for language in self.get_languages():
+            try:
+                db = self._get_db(language)
+                with db:
+                    db.execute("DELETE FROM units")
+                    db.execute(
+                        "INSERT INTO units_fts (units_fts) VALUES ('delete-all')"
+                    )
+            except sqlite3.DatabaseError as e:
+                logger.error("Removing unreadable local TM for %s: %s", language, e)
+                db = local.dbs.pop(language, None)
+                if db is not None:
+                    db.close()
+                for suffix in (".db", ".db-wal", ".db-shm"):
+                    path = os.path.join(self._path, language + suffix)
+                    if os.path.exists(path):
+                        os.remove(path)
+
+        local.frequencies = {}
+
+    def search(self, unit):
+        language = unit.store.translation_project.language.code
+        source = str(unit.source)
+        min_similarity = self._settings.get("MIN_SIMILARITY", DEFAULT_MIN_SIMILARITY)
+        if min_similarity <= 0 or min_similarity >= 1:
+            min_similarity = DEFAULT_MIN_SIMILARITY
+
+        ngrams = get_ngrams(source)
+        if not ngrams:
+            return []
+
+        # looking up rare trigrams only keeps the number of candidates low
+        query = get_ngrams_query(ngrams, self._get_frequencies(language))
+        try:
+            db = self._get_db(language)
+            with self._deadline(db):
+                rows = db.execute(
+                    SEARCH_QUERY,
+                    (
+                        query,
+                        int(len(source) * min_similarity),
+                        int(len(source) / min_similarity) + 1,
+                        MAX_CANDIDATES,
+                    ),
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Local TM error for language %s: %s", language, e)
+            return []
+
+        bodies = [json.loads(data) for unit_id_, data in rows]
+        # candidates are ranked by their matching trigrams, but it's their
+        # similarity to the source text what matters in the end
+        similarities = get_similarities(
+            source, [body["source"] for body in bodies], min_similarity=min_similarity
+        )
+        hits = sorted(
+            (
+                {"_id": str(unit_id), "_source": body, "_score": similarity}
+                for (unit_id, data_), body, similarity in zip(
+                    rows, bodies, similarities
+                )
+                if similarity is not None
+            ),
+            key=lambda hit: hit["_score"],
+            reverse=True,
+        )
+
+        return get_tm_results(unit, hits)
+
+    def update(self, language, obj):
+        self.update_many(language, [obj])
+
+    def update_many(self, language, objs):
+        rows = [
+            (
+                obj["id"],
+                obj["revision"],
+                str(obj["source"]),
+                len(str(obj["source"])),
+                json.dumps(obj, default=str),
+            )
+            for obj in objs
+        ]
+        if not rows:
+            return
+
+        try:
+            db = self._get_db(language)
+            with db:
+                db.executemany(UPDATE_QUERY, rows)
+        except sqlite3.Error as e:
+            logger.error("Local TM error for language %s: %s", language, e)
@@ -10,9 +10,23 @@
 from django.conf import settings
 
 
+#: Seconds to wait for TM servers to reply to a search
+DEFAULT_TIMEOUT = 3
+
+
 class SearchBackend(object):
-    def __init__(self):
-        self._settings = getattr(settings, "ZING_TM_SERVER", None)
+    #: keys of `ZING_TM_SERVER` the backend needs in order to be enabled
+    required_settings = ()
+
+    def __init__(self, tm_settings=None):
+        """
+        :param tm_settings: dict of settings for the backend. Defaults to
+            the `ZING_TM_SERVER` setting.
+        """
+        if tm_settings is None:
+            tm_settings = getattr(settings, "ZING_TM_SERVER", None)
+        self._settings = tm_settings
+        self._timeout = (tm_settings or {}).get("TIMEOUT", DEFAULT_TIMEOUT)
 
     def search(self, unit):
         """Search for TM results.
@@ -25,3 +39,8 @@ class SearchBackend(object):
     def update(self, language, obj):
         """Add a unit to the backend"""
         pass
+
+    def update_many(self, language, objs):
+        """Add several units to the backend at once"""
+        for obj in objs:
+            self.update(language, obj)
@@ -9,54 +9,189 @@
 
 import importlib
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
 
 from . import SearchBackend
 
 
 DEFAULT_ENGINE_MODULE = "pootle.core.search.backends.ElasticSearchBackend"
 
+#: Seconds TM results are cached for
+CACHE_TIMEOUT = 3600
+#: Maximum number of concurrent searches against TM servers
+MAX_WORKERS = 8
 
-class SearchBroker(SearchBackend):
-    def __init__(self):
-        super().__init__()
-        self._server = None
 
-        if self._settings is None:
-            return
+logger = logging.getLogger(__name__)
 
-        if "HOST" not in self._settings or "PORT" not in self._settings:
-            return
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_WORKERS, thread_name_prefix="tm-search"
+            )
+        return _executor
 
-        try:
-            engine = self._settings["ENGINE"]
-        except KeyError:
-            engine = DEFAULT_ENGINE_MODULE
 
-        _module = ".".join(engine.split(".")[:-1])
-        _search_class = engine.split(".")[-1]
+def discard_executor(executor):
+    """Stops handing out `executor`, whose workers will be gone once they are
+    done with their current searches.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
 
+
+def get_search_backend(tm_settings):
+    """Returns a TM backend instance configured by `tm_settings`, or `None`
+    if it can't be set up.
+    """
+    if not tm_settings:
+        return None
+
+    try:
+        engine = tm_settings["ENGINE"]
+    except KeyError:
+        engine = DEFAULT_ENGINE_MODULE
+
+    _module = ".".join(engine.split(".")[:-1])
+    _search_class = engine.split(".")[-1]
+
+    try:
+        module = importlib.import_module(_module)
         try:
-            module = importlib.import_module(_module)
-            try:
-                self._server = getattr(module, _search_class)()
-            except AttributeError:
-                logging.warning("No search class '%s' defined.", _search_class)
-        except ImportError:
-            logging.warning("TM search backend: cannot import '%s'", _module)
+            search_class = getattr(module, _search_class)
+        except AttributeError:
+            logging.warning("No search class '%s' defined.", _search_class)
+            return None
+    except ImportError:
+        logging.warning("TM search backend: cannot import '%s'", _module)
+        return None
+
+    required_settings = getattr(search_class, "required_settings", ())
+    if any(key not in tm_settings for key in required_settings):
+        return None
+
+    return search_class(tm_settings)
+
+
+def get_version_key(language):
+    # TM indices and databases are named after lowercased language codes
+    return "pootle:tm:version:%s" % language.lower()
+
+
+def expire_cache(language):
+    """Expires cached TM results for `language`."""
+    cache.set(get_version_key(language), time.time(), None)
+
+
+class SearchBroker(SearchBackend):
+    """Searches the TM servers set in `ZING_TM_SERVER` and
+    `ZING_TM_EXTRA_SERVERS` concurrently, and caches the merged results.
+    Updates only go to the `ZING_TM_SERVER` one.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._server = get_search_backend(self._settings)
+
+        self._servers = [self._server] if self._server is not None else []
+        for tm_settings in getattr(settings, "ZING_TM_EXTRA_SERVERS", []):
+            server = get_search_backend(tm_settings)
+            if server is not None:
+                self._servers.append(server)
+
+    @property
+    def is_enabled(self):
+        return self._server is not None
+
+    def get_cache_key(self, language, unit):
+        """Returns the key TM results for `unit` are cached with. Keys change
+        whenever the TM for `language` is updated.
+        """
+        return "pootle:tm:results:%s:%s:%s:%s" % (
+            language,
+            cache.get(get_version_key(language), 0),
+            unit.id,
+            md5(str(unit.source).encode("utf-8")).hexdigest(),
+        )
 
     def search(self, unit):
-        if not self._server:
+        if not self._servers:
             return []
 
+        # retrieving the language here also caches related objects, so that
+        # searches running in other threads don't need to query the DB
+        language = unit.store.translation_project.language.code
+        key = self.get_cache_key(language, unit)
+        results = cache.get(key)
+        if results is not None:
+            return results
+
+        results, complete = self.search_servers(unit)
+        if complete:
+            cache.set(key, results, CACHE_TIMEOUT)
+        return results
+
+    def search_servers(self, unit):
+        """Searches all TM servers concurrently, waiting for their replies for
+        up to `TIMEOUT` seconds.
+
+        :return: a tuple of merged results sorted by score, and whether all the
+            servers replied in time.
+        """
+        executor = get_executor()
+        futures = [executor.submit(server.search, unit) for server in self._servers]
+        done, not_done = wait(futures, timeout=self._timeout)
+        if not_done:
+            # backends enforce timeouts of their own, but a server hanging
+            # anyway would keep workers busy, and hold up later searches
+            for future in not_done:
+                future.cancel()
+            discard_executor(executor)
+
+        complete = True
         results = []
         counter = {}
-        for result in self._server.search(unit):
-            translation_pair = result["source"] + result["target"]
-            if translation_pair not in counter:
-                counter[translation_pair] = result["count"]
-                results.append(result)
-            else:
-                counter[translation_pair] += result["count"]
+        for server, future in zip(self._servers, futures):
+            if future not in done:
+                logger.warning(
+                    "TM server %s timed out searching for unit %s",
+                    server.__class__.__name__,
+                    unit.id,
+                )
+                complete = False
+                continue
+            if future.exception() is not None:
+                logger.error(
+                    "TM server %s failed searching for unit %s: %s",
+                    server.__class__.__name__,
+                    unit.id,
+                    future.exception(),
+                )
+                complete = False
+                continue
+
+            for result in future.result():
+                translation_pair = result["source"] + result["target"]
+                if translation_pair not in counter:
+                    counter[translation_pair] = result["count"]
+                    results.append(result)
+                else:
+                    counter[translation_pair] += result["count"]
 
         for item in results:
             item["count"] = counter[item["source"] + item["target"]]
@@ -65,10 +200,22 @@ class SearchBroker(SearchBackend):
         # score so the better matches are presented to the user.
         results = sorted(results, reverse=True, key=lambda item: item["score"])
 
-        return results
+        return results, complete
+
+    def expire_cache(self, language):
+        """Expires cached TM results for `language`."""
+        expire_cache(language)
 
     def update(self, language, obj):
         if not self._server:
             return
 
         self._server.update(language, obj)
+        self.expire_cache(language)
+
+    def update_many(self, language, objs):
+        if not self._server:
+            return
+
+        self._server.update_many(language, objs)
+        self.expire_cache(language)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import json
+import logging
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+
+from django_rq.queues import get_connection, get_queue
+
+
+__all__ = ("flush_tm_updates", "schedule_tm_update", "update_tm_job")
+
+
+KEY_TM_UPDATES = "pootle:tm:updates"
+KEY_TM_UPDATE_SCHEDULED = "pootle:tm:update.scheduled"
+
+#: Maximum number of pending TM updates sent to the TM server at once
+TM_BULK_SIZE = 2000
+#: Seconds the flag of a scheduled job outlives the job timeout, so that
+#: updates schedule a new job if the pending one is lost
+SCHEDULED_FLAG_GRACE = 60
+
+
+logger = logging.getLogger(__name__)
+
+
+def push_tm_updates(language, objs):
+    """Appends TM updates to the list of pending updates.
+
+    :param language: code of the language `objs` belong to.
+    :param objs: list of dicts of unit data, as returned by
+        `Unit.get_tm_data()`.
+    """
+    get_connection().rpush(
+        KEY_TM_UPDATES, *(json.dumps([language, obj]) for obj in objs)
+    )
+
+
+def flush_tm_updates():
+    """Sends pending TM updates to the TM server in bulk, taking at most
+    `TM_BULK_SIZE` updates at a time. Only the latest update for every unit
+    is sent.
+
+    :return: the number of updates sent.
+    """
+    from pootle_store.models import get_tm_broker
+
+    r_con = get_connection()
+    broker = get_tm_broker()
+    sent = 0
+    while True:
+        with r_con.pipeline() as pipe:
+            pipe.lrange(KEY_TM_UPDATES, 0, TM_BULK_SIZE - 1)
+            pipe.ltrim(KEY_TM_UPDATES, TM_BULK_SIZE, -1)
+            items = pipe.execute()[0]
+        if not items:
+            break
+
+        updates = OrderedDict()
+        for item in items:
+            language, obj = json.loads(item)
+            updates.setdefault(language, OrderedDict())[obj["id"]] = obj
+        for language, objs in updates.items():
+            broker.update_many(language, list(objs.values()))
+            sent += len(objs)
+
+    logger.debug("Sent %d updates to the TM server", sent)
+    return sent
+
+
+def update_tm_job():
+    """RQ job"""
+    # allow updates registered from now on to schedule a new job
+    get_connection().delete(KEY_TM_UPDATE_SCHEDULED)
+    flush_tm_updates()
+
+
+def schedule_tm_update(language, objs):
+    """Updates the TM server with `objs`.
+
+    If `ZING_TM_BATCH_UPDATES` is set, updates are queued once the
+    transaction is committed and sent in bulk by a background job, unless
+    one is already pending.
+
+    :param language: code of the language `objs` belong to.
+    :param objs: list of dicts of unit data, as returned by
+        `Unit.get_tm_data()`.
+    """
+    from pootle_store.models import get_tm_broker
+
+    broker = get_tm_broker()
+    if not objs or not broker.is_enabled:
+        return
+
+    queue = get_queue("default")
+    if not settings.ZING_TM_BATCH_UPDATES or not queue._is_async:
+        broker.update_many(language, objs)
+        return
+
+    def _schedule_tm_update():
+        push_tm_updates(language, objs)
+        if queue.connection.set(
+            KEY_TM_UPDATE_SCHEDULED,
+            1,
+            nx=True,
+            ex=queue._default_timeout + SCHEDULED_FLAG_GRACE,
+        ):
+            try:
+                queue.enqueue(update_tm_job)
+            except Exception:
+                queue.connection.delete(KEY_TM_UPDATE_SCHEDULED)
+                raise
+
+    connection.on_commit(_schedule_tm_update)
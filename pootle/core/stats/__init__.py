@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+from .engine import StatsEngine, schedule_stats_update, update_stats_job
+
+
+__all__ = ("StatsEngine", "schedule_stats_update", "update_stats_job")
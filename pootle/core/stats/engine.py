@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+import logging
+import time
+
+from django.db import connection
+
+from django_rq.queues import get_connection, get_queue
+
+from pootle.core.mixins.treeitem import (
+    KEY_DIRTY_TREEITEMS,
+    CachedMethods,
+    aggregate_stats,
+    get_empty_stats,
+    get_many_cached_stats,
+    set_many_cached_stats,
+)
+from pootle.core.url_helpers import get_all_pootle_paths
+from pootle.core.utils.list import chunked
+from pootle_app.models import Directory
+from pootle_project.models import Project
+from pootle_store.models import Store
+from pootle_store.stats import get_stores_stats
+from pootle_translationproject.models import TranslationProject
+
+
+__all__ = ("StatsEngine", "schedule_stats_update", "update_stats_job")
+
+
+KEY_STATS_BATCH_SCHEDULED = "pootle:stats:batch.scheduled"
+
+#: Maximum number of ids/paths passed to a single `IN` lookup
+QUERY_CHUNK_SIZE = 500
+#: Seconds the flag of a scheduled job outlives the job timeout, so that
+#: changes schedule a new job if the pending one is lost
+SCHEDULED_FLAG_GRACE = 60
+
+
+logger = logging.getLogger("stats")
+
+
+def is_project_path(pootle_path):
+    return pootle_path.startswith("/projects/") and pootle_path.count("/") == 3
+
+
+def is_tp_path(pootle_path):
+    """Whether `pootle_path` points to a translation project or to
+    one of its directories.
+    """
+    return (
+        pootle_path.endswith("/")
+        and pootle_path.count("/") >= 3
+        and not pootle_path.startswith("/projects/")
+    )
+
+
+class StatsEngineResult(object):
+    def __init__(self, nodes, elapsed):
+        self.nodes = nodes
+        self.elapsed = elapsed
+
+    def __str__(self):
+        return "%d nodes in %.2fs (%.1f nodes/sec)" % (
+            self.nodes,
+            self.elapsed,
+            self.nodes_per_second,
+        )
+
+    @property
+    def nodes_per_second(self):
+        if not self.elapsed:
+            return float(self.nodes)
+        return self.nodes / self.elapsed
+
+
+class StatsEngine(object):
+    """Recalculates cached stats for a batch of tree items.
+
+    Stats for all the stores involved are calculated with a handful of
+    grouped queries, then rolled up in memory through their directories,
+    translation projects and projects, and the resulting values are written
+    to the stats cache in a single pipeline.
+    """
+
+    def __init__(self, paths=None):
+        """
+        :param paths: `pootle_path`s of the tree items to recalculate. Their
+            ancestors are recalculated too. If unset, the paths registered
+            as dirty are used, and they are unregistered once done.
+        """
+        self.paths = paths
+
+    def run(self):
+        """Recalculates and caches stats.
+
+        :return: a `StatsEngineResult` instance.
+        """
+        start = time.time()
+
+        dirty = None
+        paths = self.paths
+        if paths is None:
+            dirty = self.get_dirty_paths()
+            paths = list(dirty.keys())
+
+        stats = self.calculate(paths)
+        self.set_cached_values(stats)
+
+        if dirty:
+            self.unregister_dirty(dirty)
+
+        result = StatsEngineResult(len(stats), time.time() - start)
+        logger.info("Stats engine updated %s", result)
+        return result
+
+    def get_dirty_paths(self):
+        """Returns a dict of dirty paths and their scores."""
+        r_con = get_connection()
+        dirty = r_con.zrangebyscore(KEY_DIRTY_TREEITEMS, "(0", "+inf", withscores=True)
+        return {
+            (path.decode("utf-8") if isinstance(path, bytes) else path): score
+            for path, score in dirty
+        }
+
+    def unregister_dirty(self, dirty):
+        """Decrements the dirty scores registered at the time `dirty` was
+        retrieved, keeping any increments that happened in the meantime.
+        """
+        r_con = get_connection()
+        with r_con.pipeline() as pipe:
+            for path, score in dirty.items():
+                pipe.zincrby(KEY_DIRTY_TREEITEMS, 0 - score, path)
+            pipe.zremrangebyscore(KEY_DIRTY_TREEITEMS, "-inf", 0)
+            pipe.execute()
+
+    def calculate(self, paths):
+        """Calculates stats for `paths` and all their ancestors.
+
+        :return: a dict of stats values keyed by `pootle_path`, each being
+            a dict keyed by cached method name. Values which can't be
+            calculated because some child lacks cached stats are `None`.
+        """
+        nodes = set()
+        for path in paths:
+            nodes.update(get_all_pootle_paths(path))
+
+        store_paths = [path for path in nodes if not path.endswith("/")]
+        dirs = {}
+        for chunk in chunked(
+            (path for path in nodes if is_tp_path(path)), QUERY_CHUNK_SIZE
+        ):
+            dirs.update(
+                Directory.objects.live()
+                .filter(pootle_path__in=chunk)
+                .values_list("id", "pootle_path")
+            )
+        project_codes = list(
+            Project.objects.filter(
+                code__in=[path.split("/")[2] for path in nodes if is_project_path(path)]
+            ).values_list("code", flat=True)
+        )
+
+        stats = {}
+        for chunk in chunked(store_paths, QUERY_CHUNK_SIZE):
+            stores = dict(
+                Store.objects.live()
+                .filter(pootle_path__in=chunk)
+                .values_list("id", "pootle_path")
+            )
+            store_stats = self.get_store_stats(list(stores.keys()))
+            stats.update(
+                {stores[store_id]: value for store_id, value in store_stats.items()}
+            )
+
+        children = self.get_children(dirs, project_codes)
+        self.rollup(
+            # deepest nodes go first so their parents can build on them;
+            # projects have 3 slashes but always go last
+            sorted(dirs.values(), key=lambda x: x.count("/"), reverse=True)
+            + ["/projects/%s/" % code for code in project_codes],
+            children,
+            stats,
+        )
+
+        return stats
+
+    def get_children(self, dirs, project_codes):
+        """Returns children paths for the given directories and projects.
+
+        :param dirs: dict of directory paths keyed by directory id.
+        :param project_codes: codes of the projects to get children for.
+        :return: a dict of lists of children paths, keyed by parent path.
+        """
+        children = {path: [] for path in dirs.values()}
+        for chunk in chunked(dirs.keys(), QUERY_CHUNK_SIZE):
+            for model in (Store, Directory):
+                qs = model.objects.live().filter(parent_id__in=chunk)
+                for parent_id, path in qs.values_list("parent_id", "pootle_path"):
+                    children[dirs[parent_id]].append(path)
+
+        for code in project_codes:
+            children["/projects/%s/" % code] = []
+        tps = TranslationProject.objects.live().filter(project__code__in=project_codes)
+        for code, path in tps.values_list("project__code", "pootle_path"):
+            children["/projects/%s/" % code].append(path)
+
+        return children
+
+    def rollup(self, paths, children, stats):
+        """Calculates stats for `paths` out of their children stats.
+
+        :param paths: parent paths, sorted so that children always come
+            before their parents.
+        :param children: dict of lists of children paths keyed by parent path.
+        :param stats: dict of stats already calculated. Stats for `paths` will
+            be added to it.
+        """
+        cached = self.get_cached_values(
+            {
+                child
+                for path in paths
+                for child in children[path]
+                if child not in stats and child not in children
+            }
+        )
+
+        for path in paths:
+            child_stats = [
+                stats[child] if child in stats else cached.get(child, {})
+                for child in children[path]
+            ]
+            value = get_empty_stats()
+            for name in CachedMethods.get_all():
+                child_values = [item.get(name) for item in child_stats]
+                if any(child_value is None for child_value in child_values):
+                    value[name] = None
+                    continue
+                value[name] = aggregate_stats(name, value[name], child_values)
+            stats[path] = value
+
+    def get_cached_values(self, paths):
+        """Retrieves cached stats for `paths` in a single round-trip."""
+        paths = list(paths)
+        return dict(zip(paths, get_many_cached_stats(paths)))
+
+    def set_cached_values(self, stats):
+        """Writes `stats` to the cache in a single pipeline."""
+        set_many_cached_stats(stats)
+
+    def get_store_stats(self, store_ids):
+        """Calculates stats for stores with grouped queries.
+
+        :param store_ids: ids of the stores to calculate stats for.
+        :return: a dict of stats values keyed by store id.
+        """
+        stats = {}
+        for chunk in chunked(store_ids, QUERY_CHUNK_SIZE):
+            stats.update(get_stores_stats(Store.objects.filter(pk__in=chunk)))
+        return stats
+
+
+def update_stats_job():
+    """RQ job"""
+    # allow changes registered from now on to schedule a new job
+    get_connection().delete(KEY_STATS_BATCH_SCHEDULED)
+
+    # close unusable and obsolete connections before and after the job
+    connection.close_if_unusable_or_obsolete()
+    StatsEngine().run()
+    connection.close_if_unusable_or_obsolete()
+
+
+def schedule_stats_update(instance):
+    """Registers `instance` and its ancestors as dirty and schedules a
+    batched stats update job, unless one is already pending.
+    """
+    queue = get_queue("default")
+    if not queue._is_async:
+        instance.register_all_dirty()
+        StatsEngine().run()
+        return
+
+    def _schedule_stats_update():
+        # registering happens once the transaction is committed, otherwise a
+        # running job could clear the dirty flags before the changes are
+        # visible to it
+        instance.register_all_dirty()
+        if queue.connection.set(
+            KEY_STATS_BATCH_SCHEDULED,
+            1,
+            nx=True,
+            ex=queue._default_timeout + SCHEDULED_FLAG_GRACE,
+        ):
+            try:
+                queue.enqueue(update_stats_job)
+            except Exception:
+                queue.connection.delete(KEY_STATS_BATCH_SCHEDULED)
+                raise
+
+    connection.on_commit(_schedule_stats_update)
@@ -7,6 +7,7 @@
 # AUTHORS file for copyright and authorship information.
 
 from collections.abc import Iterable
+from itertools import islice
 
 
 def flatten(elements):
@@ -20,3 +21,15 @@ def flatten(elements):
                 yield sub
         else:
             yield element
+
+
+def chunked(items, size):
+    """Split `items` into lists of at most `size` elements.
+
+    `items` can be any iterable, which is consumed lazily.
+    """
+    iterator = iter(items)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Zing contributors.
+#
+# This file is a part of the Zing project. It is distributed under the GPL3
+# or later license. See the LICENSE file for a copy of the license and the
+# AUTHORS file for copyright and authorship information.
+
+"""Batched string similarity scoring.
+
+Similarity is measured as `1 - distance / max(len(text1), len(text2))`, where
+`distance` is the Levenshtein distance between both texts.
+"""
+
+import Levenshtein
+
+try:
+    from rapidfuzz import process
+    from rapidfuzz.distance import Levenshtein as rf_levenshtein
+except ImportError:
+    process = None
+
+
+__all__ = ("get_similarities", "get_similarity")
+
+
+#: Tolerance for floating point errors in distance bounds, so texts exactly
+#: at the minimum similarity are not left out.
+EPSILON = 1e-9
+
+#: rapidfuzz rounds similarity cutoffs into distance cutoffs with a precision
+#: of its own: pass it a slightly lower cutoff, and apply the exact one to
+#: the scores it returns.
+CUTOFF_TOLERANCE = 1e-6
+
+
+def get_similarity(text1, text2):
+    """Returns how similar two texts are as a real value in the (0..1)
+    range.
+    """
+    distance = Levenshtein.distance(text1, text2)
+    return 1 - distance / float(max(len(text1), len(text2), 1))
+
+
+def get_max_distance(length1, length2, min_similarity):
+    """Returns the highest distance two texts of the given lengths can be
+    apart while still being `min_similarity` similar.
+    """
+    return int((1 - min_similarity) * max(length1, length2) + EPSILON)
+
+
+def get_similarities(text, candidates, min_similarity=0):
+    """Returns the similarity (0..1) of `text` to each of `candidates`.
+
+    Candidates less similar than `min_similarity` are not fully compared: the
+    comparison is cut off once they are known to be too far apart, and their
+    similarity is returned as `None`.
+
+    :param text: text to compare candidates against.
+    :param candidates: sequence of texts.
+    :param min_similarity: real value in the (0..1) range.
+    :return: a list with the similarity of every candidate, in the same order
+        as `candidates`.
+    """
+    candidates = list(candidates)
+    similarities = [None] * len(candidates)
+
+    if process is not None:
+        # all the candidates are compared in a single native call
+        for candidate_, similarity, i in process.extract(
+            text,
+            candidates,
+            scorer=rf_levenshtein.normalized_similarity,
+            score_cutoff=max(min_similarity - CUTOFF_TOLERANCE, 0),
+            limit=None,
+        ):
+            if similarity >= min_similarity:
+                similarities[i] = similarity
+        return similarities
+
+    text_length = len(text)
+    for i, candidate in enumerate(candidates):
+        candidate_length = len(candidate)
+        max_distance = get_max_distance(text_length, candidate_length, min_similarity)
+        # the distance is at least the difference in length
+        if abs(text_length - candidate_length) > max_distance:
+            continue
+
+        similarity = get_similarity(text, candidate)
+        if similarity >= min_similarity:
+            similarities[i] = similarity
+
+    return similarities
@@ -7,13 +7,22 @@
 # or later license. See the LICENSE file for a copy of the license and the
 # AUTHORS file for copyright and authorship information.
 
+import csv
+import io
 from itertools import groupby
 
+from translate.storage import po
+
 from django.forms import ValidationError
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
+from django.template.loader import render_to_string
 
 from pootle.core.helpers import get_filter_name
+from pootle.core.utils.version import get_major_minor_version
+from pootle_store.constants import FUZZY
 from pootle_store.forms import UnitExportForm
+from pootle_store.models import Store, Unit
+from pootle_store.syncer import UnitSyncer
 from pootle_store.unit.search import DBSearchBackend
 
 from .base import PootleDetailView
@@ -22,18 +31,212 @@ from .base import PootleDetailView
 # Limit export view results to this amount of units
 UNITS_LIMIT = 1000
 
+#: Number of units fetched from the DB at a time when streaming exports
+EXPORT_CHUNK_SIZE = 2000
+
+#: Unit fields streamed exports are made of
+EXPORT_FIELDS = (
+    "id",
+    "store_id",
+    "unitid",
+    "context",
+    "source_f",
+    "target_f",
+    "state",
+    "locations",
+    "developer_comment",
+    "translator_comment",
+)
+
+
+def iter_units(search_backend, chunk_size=None):
+    """Yields the units matching `search_backend` in lists of up to
+    `chunk_size` units, `EXPORT_CHUNK_SIZE` by default.
+
+    Only `EXPORT_FIELDS` are read from the DB, as plain values and a chunk at
+    a time, and the stores units belong to are the only objects kept around,
+    so memory usage doesn't grow with the number of units.
+    """
+    # `Model.from_db()` expects fields in their declaration order
+    field_names = [
+        field.attname
+        for field in Unit._meta.concrete_fields
+        if field.attname in EXPORT_FIELDS
+    ]
+    if chunk_size is None:
+        chunk_size = EXPORT_CHUNK_SIZE
+    db = search_backend.results.db
+    stores = {}
+    for chunk in search_backend.iter_results(field_names, chunk_size):
+        units = [Unit.from_db(db, field_names, row) for row in chunk]
+
+        missing = {unit.store_id for unit in units} - stores.keys()
+        if missing:
+            stores.update(
+                Store.objects.select_related(
+                    "translation_project__language", "translation_project__project",
+                ).in_bulk(missing)
+            )
+        for unit in units:
+            unit.store = stores[unit.store_id]
+
+        yield units
+
+
+class ExportWriter(object):
+    """Writes units in an export format, one chunk at a time."""
+
+    content_type = None
+    extension = None
+    #: Whether exports are downloaded rather than displayed by browsers
+    attachment = True
+
+    def __init__(self, request, context):
+        self.request = request
+        self.context = context
+
+    def get_header(self):
+        return ""
+
+    def get_units(self, units):
+        """Returns the serialized `units`.
+
+        :param units: list of units, possibly empty if there are no units to
+            export at all.
+        """
+        raise NotImplementedError
+
+    def get_footer(self):
+        return ""
+
+    def write(self, chunks):
+        """Yields the export of the units in `chunks` piece by piece."""
+        yield self.get_header()
+
+        empty = True
+        for units in chunks:
+            empty = False
+            yield self.get_units(units)
+        if empty:
+            yield self.get_units([])
+
+        yield self.get_footer()
+
+
+class HTMLExportWriter(ExportWriter):
+    content_type = "text/html; charset=utf-8"
+    extension = "html"
+    attachment = False
+
+    def __init__(self, request, context):
+        super().__init__(request, context)
+        #: path of the store the last written unit belongs to
+        self.pootle_path = None
+
+    def render(self, template_name, **kwargs):
+        return render_to_string(
+            template_name, dict(self.context, **kwargs), request=self.request
+        )
+
+    def get_header(self):
+        return self.render("editor/_export_view_header.html")
+
+    def get_units(self, units):
+        # units of stores spanning several chunks are grouped under the
+        # header written along with the first chunk
+        unit_groups = []
+        for path, group in groupby(units, lambda x: x.store.pootle_path):
+            unit_groups.append(
+                (path if path != self.pootle_path else None, list(group))
+            )
+            self.pootle_path = path
+        return self.render("editor/_export_view_units.html", unit_groups=unit_groups)
+
+    def get_footer(self):
+        return self.render("editor/_export_view_footer.html")
+
+
+class POExportWriter(ExportWriter):
+    content_type = "text/x-gettext-translation; charset=utf-8"
+    extension = "po"
+
+    def get_header(self):
+        store = po.pofile()
+        store.updateheader(add=True, X_Generator="Zing %s" % get_major_minor_version())
+        language = self.context["language"]
+        if language is not None:
+            store.updateheader(add=True, Language=language.code)
+            if language.nplurals and language.pluralequation:
+                store.updateheaderplural(language.nplurals, language.pluralequation)
+        return bytes(store).decode("utf-8")
+
+    def get_units(self, units):
+        return "".join("\n%s" % UnitSyncer(unit).convert(po.pounit) for unit in units)
+
+
+class CSVExportWriter(ExportWriter):
+    content_type = "text/csv; charset=utf-8"
+    extension = "csv"
+    columns = (
+        "id",
+        "path",
+        "context",
+        "source",
+        "target",
+        "fuzzy",
+        "translator_comment",
+        "developer_comment",
+        "locations",
+    )
+
+    def get_csv(self, rows):
+        output = io.StringIO()
+        csv.writer(output).writerows(rows)
+        return output.getvalue()
+
+    def get_header(self):
+        return self.get_csv([self.columns])
+
+    def get_units(self, units):
+        return self.get_csv(
+            [
+                unit.id,
+                unit.store.pootle_path,
+                unit.context or "",
+                "\n".join(unit.source.strings),
+                "\n".join(unit.target.strings),
+                int(unit.state == FUZZY),
+                unit.translator_comment or "",
+                unit.developer_comment or "",
+                unit.locations or "",
+            ]
+            for unit in units
+        )
+
+
+#: Writers of the formats units can be exported to
+EXPORT_WRITERS = {
+    "html": HTMLExportWriter,
+    "po": POExportWriter,
+    "csv": CSVExportWriter,
+}
+
 
 class PootleExportView(PootleDetailView):
+    """Displays the first `UNITS_LIMIT` units matching the search parameters
+    given in the query string.
+
+    When a `format` is given, all the units matching the search are exported
+    to it instead, and the export is streamed as units are read from the DB.
+    """
+
     template_name = "editor/export_view.html"
 
     @property
     def path(self):
         return self.request.path.replace("export-view/", "")
 
-    def get_context_data(self, *args, **kwargs):
-        ctx = {}
-        filter_name, filter_extra = get_filter_name(self.request.GET)
-
+    def get_search_backend(self):
         form_data = self.request.GET.copy()
         form_data["path"] = self.path
         form_data["include_disabled"] = "all" in self.request.GET
@@ -43,9 +246,49 @@ class PootleExportView(PootleDetailView):
         if not search_form.is_valid():
             raise Http404(ValidationError(search_form.errors).messages)
 
-        total, start_, end_, units_qs = DBSearchBackend(
-            self.request.user, **search_form.cleaned_data
-        ).search(limit=UNITS_LIMIT)
+        return DBSearchBackend(self.request.user, **search_form.cleaned_data)
+
+    def get_export_context(self):
+        filter_name, filter_extra = get_filter_name(self.request.GET)
+        return {
+            "filter_name": filter_name,
+            "filter_extra": filter_extra,
+            "source_language": self.source_language,
+            "language": self.language,
+            "project": self.project,
+        }
+
+    def get_export_filename(self, extension):
+        name = "-".join(part for part in self.path.split("/") if part)
+        return "%s.%s" % (name or "export", extension)
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get("format")
+        if export_format is None:
+            return super().get(request, *args, **kwargs)
+
+        if export_format not in EXPORT_WRITERS:
+            raise Http404("Unsupported export format")
+
+        self.object = self.get_object()
+        writer_class = EXPORT_WRITERS[export_format]
+        writer = writer_class(request, self.get_export_context())
+        response = StreamingHttpResponse(
+            writer.write(iter_units(self.get_search_backend())),
+            content_type=writer.content_type,
+        )
+        if writer.attachment:
+            response["Content-Disposition"] = 'attachment; filename="%s"' % (
+                self.get_export_filename(writer.extension)
+            )
+        return response
+
+    def get_context_data(self, *args, **kwargs):
+        ctx = {}
+
+        total, start_, end_, units_qs = self.get_search_backend().search(
+            limit=UNITS_LIMIT
+        )
 
         units_qs = units_qs.select_related("store")
 
@@ -57,14 +300,6 @@ class PootleExportView(PootleDetailView):
             for path, units in groupby(units_qs, lambda x: x.store.pootle_path)
         ]
 
-        ctx.update(
-            {
-                "unit_groups": unit_groups,
-                "filter_name": filter_name,
-                "filter_extra": filter_extra,
-                "source_language": self.source_language,
-                "language": self.language,
-                "project": self.project,
-            }
-        )
+        ctx["unit_groups"] = unit_groups
+        ctx.update(self.get_export_context())
         return ctx